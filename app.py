@@ -14,7 +14,13 @@ import plotly.express as px
 
 # Helper mod
 import helper_drawtable
-from helper_app import data_bars
+from helper_app import BAR_SUFFIX, add_bar_column, data_bars, highlight_nonzero
+from helper_metrics import registerMetrics
+from helper_mapasset import registerMapRoute
+from helper_locator import registerLocateRoute
+from helper_zones import registerZoneRoutes
+from helper_tablequery import TableQuery
+from helper_mapstyle import DEFAULT_METRIC, DEFAULT_SCHEME, METRICS, SCHEMES, styleJSON
 
 # external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 external_stylesheets = [dbc.themes.DARKLY]
@@ -22,8 +28,26 @@ external_stylesheets = [dbc.themes.DARKLY]
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 app.title = "Koufu in SG - Visualization"
 server = app.server
+# Latency and payload size of every route, scraped from /metrics
+registerMetrics(server)
+registerLocateRoute(server)
+# GeoJSON of the zone layers map.html only fetches once zoomed in to them
+registerZoneRoutes(server)
+map_url = registerMapRoute(server, "./map.html")
 
-df = helper_drawtable.main()
+# Built once per deploy and reused from disk; with gunicorn --preload this runs in the
+# master only and the workers share the result.
+df = helper_drawtable.loadTable()
+brand_cols = [c for c in df.columns[4:] if c != helper_drawtable.WHITESPACE_COL]
+# Bar widths are worked out once here, the table only matches them by value.
+df = add_bar_column(df, "Population Density (/km2)")
+# Sort orders are precomputed, the table callback only slices out one page.
+table_query = TableQuery(df)
+PAGE_SIZE = 20
+DEFAULT_SORT = [{"column_id": "Population Density (/km2)", "direction": "desc"}]
+first_page, first_page_count = table_query.page(0, PAGE_SIZE, DEFAULT_SORT)
+# Restyle payload of the map as first drawn, the rest are built on first use.
+styleJSON(DEFAULT_METRIC, DEFAULT_SCHEME)
 
 
 app.layout = html.Div(
@@ -67,16 +91,44 @@ app.layout = html.Div(
                                 - The choropleth layer provides more information about the zone, with the colors indicating the population density of each zone. 
                                 The darkest colors are zones that have the highest population density. 
                                 - **Mouse over subzones (tap if on mobile) displays more information about each subzone.**
+                                - The dropdowns above the map switch the metric and colour scheme of the choropleth.
                                 """
                     )
                 ),
             ]
         ),
         html.Hr(),
+        dbc.Row(
+            children=[
+                dbc.Col(
+                    dcc.Dropdown(
+                        id="map-metric",
+                        options=[{"label": v, "value": k} for k, v in METRICS.items()],
+                        value=DEFAULT_METRIC,
+                        clearable=False,
+                    ),
+                    width=4,
+                ),
+                dbc.Col(
+                    dcc.Dropdown(
+                        id="map-scheme",
+                        options=[{"label": s, "value": s} for s in SCHEMES],
+                        value=DEFAULT_SCHEME,
+                        clearable=False,
+                    ),
+                    width=2,
+                ),
+            ],
+            justify="center",
+            style={"color": "black", "marginBottom": "8px"},
+        ),
+        # Serialized restyle payload, handed to the map iframe by a clientside callback
+        dcc.Store(id="map-style"),
+        html.Div(id="map-style-sent", style={"display": "none"}),
         html.Div(
             children=html.Iframe(
                 id="map",
-                srcDoc=open("./map.html", "r").read(),
+                src=map_url,
                 width="95%",
                 height="750",
             ),
@@ -86,14 +138,24 @@ app.layout = html.Div(
             children="Summary table of zone information aggregated into their Planning Areas"
         ),
         html.Div(
-            children="Default sort by population density in descending order",
+            children="Default sort by population density in descending order. Type into the row under the headers to filter, e.g. > 5000 or contains BEDOK.",
             style={"fontSize": "small", "fontStyle": "italic"},
         ),
         dash_table.DataTable(
             id="table",
-            data=df.to_dict("records"),
-            columns=([{"name": i, "id": i} for i in df.columns]),
-            sort_action="native",
+            data=first_page,
+            columns=(
+                [{"name": i, "id": i} for i in df.columns if not i.endswith(BAR_SUFFIX)]
+            ),
+            page_action="custom",
+            page_current=0,
+            page_size=PAGE_SIZE,
+            page_count=first_page_count,
+            sort_action="custom",
+            sort_mode="single",
+            sort_by=DEFAULT_SORT,
+            filter_action="custom",
+            filter_query="",
             style_header={
                 # "backgroundColor": "white",
                 "fontWeight": "bold",
@@ -114,21 +176,52 @@ app.layout = html.Div(
             ],
             style_data_conditional=(
                 data_bars(df, "Population Density (/km2)")
-                + [
-                    {
-                        "if": {
-                            "filter_query": "{{{}}} != 0".format(col),
-                            "column_id": col,
-                        },
-                        "backgroundColor": "darkorange",
-                        "color": "white",
-                    }
-                    for col in df.columns[4:]
-                ]
+                + highlight_nonzero(brand_cols)
             ),
         ),
     ],
 )
 
+@app.callback(
+    [Output("table", "data"), Output("table", "page_count")],
+    [
+        Input("table", "page_current"),
+        Input("table", "page_size"),
+        Input("table", "sort_by"),
+        Input("table", "filter_query"),
+    ],
+)
+def update_table(page_current, page_size, sort_by, filter_query):
+    try:
+        return table_query.page(page_current, page_size, sort_by, filter_query)
+    except ValueError:
+        # Half typed filters can't be parsed yet, show nothing until they can.
+        return [], 1
+
+
+@app.callback(
+    Output("map-style", "data"),
+    [Input("map-metric", "value"), Input("map-scheme", "value")],
+)
+def update_map_style(metric, scheme):
+    # Already serialized and cached, no geometry goes over the wire.
+    return styleJSON(metric, scheme)
+
+
+app.clientside_callback(
+    """
+    function (style) {
+        var frame = document.getElementById("map");
+        if (style && frame && frame.contentWindow) {
+            frame.contentWindow.postMessage(JSON.parse(style), window.location.origin);
+        }
+        return "";
+    }
+    """,
+    Output("map-style-sent", "children"),
+    [Input("map-style", "data")],
+)
+
+
 if __name__ == "__main__":
     app.run_server(debug=True)
\ No newline at end of file
@@ -0,0 +1,61 @@
+# %% Import libraries
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from helper_catchment import RADII, CatchmentIndex
+from helper_store import loadGeoFile
+
+"""
+Catchment populations for synthetic outlets at every radius in helper_catchment.RADII.
+Points are drawn uniformly over Singapore's bounding box, so some fall in the sea.
+
+Run from the project root:
+    python benchmarks/bench_catchment.py --outlets 100 1000 5000
+"""
+
+# %% Functions
+
+
+def randomPoints(gdf, n, seed=0):
+    minx, miny, maxx, maxy = gdf.to_crs(epsg=4326).total_bounds
+    rng = np.random.default_rng(seed)
+    return rng.uniform(miny, maxy, n), rng.uniform(minx, maxx, n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--outlets", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument(
+        "--file", default=os.path.join(ROOT_DIR, "data", "r2_cleanboundary.geojson")
+    )
+    args = parser.parse_args()
+
+    gdf = loadGeoFile(args.file, columns=["pop"])
+    start = time.perf_counter()
+    index = CatchmentIndex(gdf)
+    print(json.dumps({"build_s": round(time.perf_counter() - start, 4)}))
+    for n in args.outlets:
+        lats, lngs = randomPoints(gdf, n)
+        start = time.perf_counter()
+        index.population(lats, lngs, RADII)
+        print(
+            json.dumps(
+                {
+                    "outlets": n,
+                    "radii": len(RADII),
+                    "s": round(time.perf_counter() - start, 4),
+                }
+            )
+        )
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
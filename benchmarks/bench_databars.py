@@ -0,0 +1,102 @@
+# %% Import libraries
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+import helper_app
+from helper_app import add_bar_column, data_bars
+
+"""
+Data bar styling as the row count grows, old filter_query ranges against the
+precomputed bar widths in helper_app.
+The browser checks every rule against every cell of the column on each render, so
+rules x rows is the number of filter evaluations the table does per render.
+
+Run from the project root:
+    python benchmarks/bench_databars.py --rows 55 332 3320 33200
+"""
+
+COLUMN = "Population Density (/km2)"
+
+# %% Functions
+
+
+def legacyDataBars(df, column, n_bins=100):
+    """
+    The previous helper_app.data_bars, kept here as the baseline.
+    """
+    bounds = [i * (1.0 / n_bins) for i in range(n_bins + 1)]
+    lo, hi = df[column].min(), df[column].max()
+    ranges = [((hi - lo) * i) + lo for i in bounds]
+    styles = []
+    for i in range(1, len(bounds)):
+        query = "{{{column}}} >= {min_bound}".format(column=column, min_bound=ranges[i - 1])
+        if i < len(bounds) - 1:
+            query += " && {{{column}}} < {max_bound}".format(
+                column=column, max_bound=ranges[i]
+            )
+        styles.append(
+            {
+                "if": {"filter_query": query, "column_id": column},
+                "background": f"linear-gradient(90deg, #D12300 {bounds[i] * 100}%)",
+            }
+        )
+    return styles
+
+
+def timeit(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[55, 332, 3320, 33200])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        df = pd.DataFrame({COLUMN: rng.integers(0, 60000, rows)})
+        legacy = legacyDataBars(df, COLUMN)
+
+        def _new():
+            barred = add_bar_column(df, COLUMN)
+            return data_bars(barred, COLUMN)
+
+        helper_app._step_cache.clear()
+        helper_app._bar_rules.cache_clear()
+        start = time.perf_counter()
+        rules = _new()
+        cold_s = time.perf_counter() - start
+        print(
+            json.dumps(
+                {
+                    "rows": rows,
+                    "legacy_rules": len(legacy),
+                    "legacy_evaluations": len(legacy) * rows,
+                    "legacy_payload_bytes": len(json.dumps(legacy)),
+                    "legacy_s": round(timeit(lambda: legacyDataBars(df, COLUMN)), 5),
+                    "rules": len(rules),
+                    "evaluations": len(rules) * rows,
+                    "payload_bytes": len(json.dumps(rules)),
+                    "cold_s": round(cold_s, 5),
+                    "memoized_s": round(timeit(_new), 5),
+                }
+            )
+        )
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
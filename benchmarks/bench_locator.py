@@ -0,0 +1,83 @@
+# %% Import libraries
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import geopandas as gpd
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from helper_locator import SubzoneLocator
+from helper_store import loadGeoFile
+
+"""
+SubzoneLocator against the gpd.sjoin that r2b_outletgeocode used to run.
+Points are drawn uniformly over Singapore's bounding box, so some fall in the sea.
+
+Run from the project root:
+    python benchmarks/bench_locator.py --points 100 1000 10000
+"""
+
+# %% Functions
+
+
+def randomPoints(gdf, n, seed=0):
+    minx, miny, maxx, maxy = gdf.to_crs(epsg=4326).total_bounds
+    rng = np.random.default_rng(seed)
+    return rng.uniform(miny, maxy, n), rng.uniform(minx, maxx, n)
+
+
+def sjoinZones(gdf, lats, lngs):
+    points = gpd.GeoDataFrame(geometry=gpd.points_from_xy(lngs, lats, crs=4326))
+    points = points.to_crs(gdf.crs)
+    return gpd.sjoin(points, gdf, how="left", op="within")
+
+
+def timeit(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--points", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument(
+        "--file", default=os.path.join(ROOT_DIR, "data", "r2_cleanboundary.geojson")
+    )
+    args = parser.parse_args()
+
+    gdf = loadGeoFile(args.file)
+    build_s = timeit(lambda: SubzoneLocator(gdf), repeat=1)
+    locator = SubzoneLocator(gdf)
+
+    lat, lng = randomPoints(gdf, 1000, seed=1)
+    start = time.perf_counter()
+    for a, b in zip(lat, lng):
+        # locateIndex skips building a DataFrame, so this times the lookup itself.
+        locator.locateIndex([a], [b])
+    single_ms = (time.perf_counter() - start) / len(lat) * 1000
+
+    print(json.dumps({"build_s": round(build_s, 4), "single_ms": round(single_ms, 4)}))
+    for n in args.points:
+        lats, lngs = randomPoints(gdf, n)
+        print(
+            json.dumps(
+                {
+                    "points": n,
+                    "sjoin_s": round(timeit(lambda: sjoinZones(gdf, lats, lngs)), 4),
+                    "locator_s": round(timeit(lambda: locator.locate(lats, lngs)), 4),
+                }
+            )
+        )
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# %% Import libraries
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import folium
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+from helper_drawmap import createBaseMap, loopcreatePoints
+
+"""
+Generated html size and JS object count of the outlet layers, one folium CircleMarker
+plus one DivIcon Marker per outlet against one canvas payload per brand.
+JS objects are counted as Leaflet constructor calls (L.xxx(...)) in the rendered html.
+
+Run from the project root:
+    python benchmarks/bench_outlets.py --outlets 100 1000 10000
+"""
+
+BRANDS = [
+    "Koufu",
+    "Cookhouse",
+    "Rasapura",
+    "ForkSpoon",
+    "HappyHawkers",
+    "Gourmet",
+    "R&B",
+    "1983NY",
+    "Supertea",
+    "1983CT",
+    "Elemen",
+    "Grove",
+]
+CONSTRUCTOR_PATT = re.compile(r"\bL\.[A-Za-z]+\(")
+
+# %% Functions
+
+
+def syntheticOutlets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "brand": rng.choice(BRANDS, n),
+            "address": [f"Blk {i} Example Street #01-{i % 100:02d}" for i in range(n)],
+            "lat": rng.uniform(1.25, 1.45, n),
+            "lng": rng.uniform(103.65, 104.0, n),
+        }
+    )
+
+
+def legacyPoints(map_obj, df):
+    """
+    The previous loopcreatePoints body, kept here as the baseline.
+    """
+    for brand in BRANDS:
+        new_df = df[df["brand"] == brand]
+        layer = folium.FeatureGroup(name=f"{brand} Layer", overlay=True, control=True)
+        for address, lat, lng in zip(new_df["address"], new_df["lat"], new_df["lng"]):
+            tooltip = f"<b>Brand:</b> {brand} <br><b>Address:</b> {address}"
+            folium.CircleMarker(
+                location=(lat, lng), radius=10, tooltip=tooltip, color="red", weight=1
+            ).add_to(layer)
+            folium.Marker(
+                location=(lat + 0.00001, lng + 0.00001),
+                tooltip=tooltip,
+                icon=folium.DivIcon(html=f"<div>{brand[0]}</div>"),
+            ).add_to(layer)
+        layer.add_to(map_obj)
+    return map_obj
+
+
+def measure(build):
+    start = time.perf_counter()
+    map_obj = build()
+    html = map_obj.get_root().render()
+    return {
+        "s": round(time.perf_counter() - start, 3),
+        "html_bytes": len(html.encode("utf-8")),
+        "js_objects": len(CONSTRUCTOR_PATT.findall(html)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--outlets", type=int, nargs="+", default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    tmp = os.path.join(ROOT_DIR, "data", "cache", "bench_outlets.csv")
+    os.makedirs(os.path.dirname(tmp), exist_ok=True)
+    for n in args.outlets:
+        df = syntheticOutlets(n)
+        df.to_csv(tmp, index=False)
+        legacy = measure(lambda: legacyPoints(createBaseMap(), df))
+        layers = measure(lambda: loopcreatePoints(createBaseMap(), tmp))
+        print(
+            json.dumps(
+                {
+                    "outlets": n,
+                    **{f"legacy_{k}": v for k, v in legacy.items()},
+                    **layers,
+                }
+            )
+        )
+    os.remove(tmp)
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
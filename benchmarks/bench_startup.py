@@ -0,0 +1,129 @@
+# %% Import libraries
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+"""
+Cold start of the dashboard under gunicorn, with and without --preload.
+For each worker count it records the time until every worker has loaded the app and the
+total proportional set size (PSS) of the master plus workers. Linux only.
+
+The summary table is cached under data/cache, clear it first to time a first deploy.
+Run from the project root:
+    python benchmarks/bench_startup.py --workers 1 2 4 8
+"""
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# %% Functions
+
+
+def _children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def _pssKb(pid):
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    return 0
+
+
+# Same gc.freeze() as gunicorn.conf.py, plus a hook marking each worker as ready.
+HOOK_CONFIG = """
+import gc
+import time
+
+def when_ready(server):
+    gc.freeze()
+
+def post_worker_init(worker):
+    with open({ready_file!r}, "a") as f:
+        f.write(f"{{worker.pid}} {{time.time()}}\\n")
+"""
+
+
+def _ready(ready_file, workers, timeout):
+    """
+    Blocks until every worker has loaded the app. Returns False on timeout.
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if os.path.isfile(ready_file):
+            with open(ready_file) as f:
+                if len(f.read().splitlines()) >= workers:
+                    return True
+        time.sleep(0.05)
+    return False
+
+
+def run(workers, preload, port, timeout):
+    tmp = tempfile.mkdtemp()
+    ready_file = os.path.join(tmp, "ready.txt")
+    config = os.path.join(tmp, "bench.conf.py")
+    with open(config, "w") as f:
+        f.write(HOOK_CONFIG.format(ready_file=ready_file))
+
+    cmd = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "--config",
+        config,
+        "--workers",
+        str(workers),
+        "--bind",
+        f"127.0.0.1:{port}",
+        "app:server",
+    ]
+    if preload:
+        cmd.append("--preload")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        ok = _ready(ready_file, workers, timeout)
+        elapsed = time.perf_counter() - start
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/_dash-layout") as response:
+            layout_bytes = len(response.read())
+        pids = [proc.pid] + _children(proc.pid)
+        pss = sum(_pssKb(p) for p in pids)
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "workers": workers,
+        "preload": preload,
+        "ready": ok,
+        "startup_s": round(elapsed, 3),
+        "pss_mb": round(pss / 1024, 1),
+        "pss_per_worker_mb": round(pss / 1024 / workers, 1),
+        "layout_bytes": layout_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        for preload in (False, True):
+            print(json.dumps(run(workers, preload, args.port, args.timeout)))
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+# %% Import libraries
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+"""
+Benchmark suite for the map and dashboard build, run against the committed data files.
+Each case is timed --repeat times and the best run kept, sizes are measured once.
+Results are printed as JSON lines and written to --output. Every metric is compared
+against the committed baseline and the run exits with status 1 if any regressed past
+its threshold. A missing baseline is an error too, unless --allow-missing-baseline.
+
+Timings are compared relative to a fixed calibration workload timed in the same run, so
+a baseline recorded on one machine still holds on a faster or slower one. A different
+Python, NumPy or pandas version can still shift the ratios, re-record the baseline on the
+machine (or CI image) that runs the comparison when those change.
+
+Caches under data/cache are left as they are, so these are warm timings. Clear the
+folder first to time a first build.
+
+Run from the project root:
+    python benchmarks/run.py --save-baseline   # record benchmarks/baseline.json
+    python benchmarks/run.py                   # compare against it
+"""
+
+# %% Constants
+BASELINE_FILE = os.path.join(ROOT_DIR, "benchmarks", "baseline.json")
+RESULTS_FILE = os.path.join(ROOT_DIR, "data", "cache", "bench_results.json")
+BOUNDARY_FILE = "./data/r2_cleanboundary.geojson"
+OUTLET_FILE = "./data/r2b_outletgeocode.csv"
+TARGET_COL = "pop_density/km2"
+# Allowed growth over the baseline before a metric counts as a regression
+TIME_THRESHOLD = 0.25
+SIZE_THRESHOLD = 0.05
+# Timing differences below this are noise whatever the ratio
+MIN_TIME_DELTA_S = 0.02
+CALIBRATION_METRIC = "calibration_s"
+
+# Imports app in a fresh interpreter, so module level setup is timed cold.
+APP_READY_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+ready_s = time.perf_counter() - start
+from plotly.utils import PlotlyJSONEncoder
+layout = json.dumps(app.app.layout, cls=PlotlyJSONEncoder)
+print(json.dumps({"ready_s": ready_s, "layout_bytes": len(layout.encode("utf-8"))}))
+"""
+
+# %% Functions
+
+
+def best(run, repeat, setup=None):
+    """
+    Returns the fastest of repeat calls of run in seconds.
+    setup, if given, returns fresh arguments for each call and is not timed.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def calibration(repeat):
+    """
+    Best time of a fixed mix of interpreter, NumPy and json work, the unit the other
+    timings are compared in.
+    """
+
+    def work():
+        sum(i * i for i in range(200_000))
+        np.sort(np.random.default_rng(0).random(500_000))
+        json.dumps([{"key": i, "value": str(i)} for i in range(20_000)])
+
+    return {CALIBRATION_METRIC: best(work, max(repeat, 5))}
+
+
+def mapCases(repeat):
+    from helper_drawmap import (
+        createBaseMap,
+        createZoomChoropleth,
+        loopcreatePoints,
+        zoomLayers,
+    )
+
+    layers, urls = zoomLayers(BOUNDARY_FILE, TARGET_COL)
+    baseMap = lambda: (createBaseMap(),)
+
+    def fullMap():
+        sg_map = createZoomChoropleth(
+            layers, createBaseMap(), TARGET_COL, "Reds", bins=5, urls=urls
+        )
+        return (loopcreatePoints(sg_map, OUTLET_FILE),)
+
+    results = {
+        "zoomLayers_s": best(lambda: zoomLayers(BOUNDARY_FILE, TARGET_COL), repeat),
+        "createZoomChoropleth_s": best(
+            lambda m: createZoomChoropleth(
+                layers, m, TARGET_COL, "Reds", bins=5, urls=urls
+            ),
+            repeat,
+            setup=baseMap,
+        ),
+        "loopcreatePoints_s": best(
+            lambda m: loopcreatePoints(m, OUTLET_FILE), repeat, setup=baseMap
+        ),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "map.html")
+        results["map_save_s"] = best(lambda m: m.save(path), repeat, setup=fullMap)
+        results["map_html_bytes"] = os.path.getsize(path)
+    return results
+
+
+def tableCases(repeat):
+    import helper_drawtable
+
+    return {"drawtable_main_s": best(helper_drawtable.main, repeat)}
+
+
+def appCases(repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", APP_READY_SCRIPT],
+            cwd=ROOT_DIR,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "app_ready_s": min(r["ready_s"] for r in runs),
+        "layout_bytes": runs[-1]["layout_bytes"],
+    }
+
+
+def threshold(metric, time_threshold, size_threshold):
+    return time_threshold if metric.endswith("_s") else size_threshold
+
+
+def compare(results, baseline, time_threshold, size_threshold):
+    """
+    Returns one row per metric found in both, flagging regressions.
+    Baseline timings are first scaled by how much slower or faster this machine ran the
+    calibration workload.
+    """
+    scale = 1.0
+    if baseline.get(CALIBRATION_METRIC) and results.get(CALIBRATION_METRIC):
+        scale = results[CALIBRATION_METRIC] / baseline[CALIBRATION_METRIC]
+    rows = []
+    for metric, value in results.items():
+        if metric not in baseline or metric == CALIBRATION_METRIC:
+            continue
+        base = baseline[metric]
+        if metric.endswith("_s"):
+            base = round(base * scale, 4)
+        limit = base * (1 + threshold(metric, time_threshold, size_threshold))
+        regressed = value > limit
+        if metric.endswith("_s") and value - base < MIN_TIME_DELTA_S:
+            regressed = False
+        rows.append(
+            {
+                "metric": metric,
+                "baseline": base,
+                "value": value,
+                "change_%": round((value / base - 1) * 100, 1) if base else None,
+                "regressed": regressed,
+            }
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="write this run's results as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--allow-missing-baseline",
+        action="store_true",
+        help="exit 0 instead of failing when there is no baseline to compare against",
+    )
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--size-threshold", type=float, default=SIZE_THRESHOLD)
+    args = parser.parse_args()
+
+    # The helpers read their data through paths relative to the project root.
+    os.chdir(ROOT_DIR)
+    results = calibration(args.repeat)
+    results.update(mapCases(args.repeat))
+    results.update(tableCases(args.repeat))
+    results.update(appCases(args.repeat))
+    results = {k: round(v, 4) if k.endswith("_s") else v for k, v in results.items()}
+    for metric, value in results.items():
+        print(json.dumps({"metric": metric, "value": value}))
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+    if not os.path.isfile(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first.")
+        return 0 if args.allow_missing_baseline else 1
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    rows = compare(results, baseline, args.time_threshold, args.size_threshold)
+    if CALIBRATION_METRIC in baseline:
+        scale = results[CALIBRATION_METRIC] / baseline[CALIBRATION_METRIC]
+        print(f"Baseline timings scaled by {scale:.2f} for this machine.")
+    for row in rows:
+        print(json.dumps(row))
+    regressed = [row["metric"] for row in rows if row["regressed"]]
+    if regressed:
+        print(f"Regressed past threshold: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+# %% Main execute
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,467 @@
+# %% Import libraries
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from helper_cache import ROOT_DIR, cachePath, fileHash
+
+"""
+One command for the whole pipeline, modelled as a dependency graph.
+- Each stage lists the files it reads, the files it writes and the code it runs. The
+  project modules its script imports, directly or through other helpers, are added to
+  its code automatically, so a new helper can't be left out.
+- A stage is skipped when the hash of its inputs and code matches the last successful run
+  and its outputs are still there.
+- Stages whose dependencies are done run in parallel, so the boundary and outlet
+  branches build side by side. The boundary's columnar store is compiled by its own
+  stage first, so the stages reading it never compile it at the same time.
+- Stages marked external hit the network (and for geocoding, a paid API). They only run
+  when their outputs are missing, their own script changed, or they are forced. Their
+  imports are left out of the key, an edit to a shared helper doesn't re-fetch anything.
+
+Usage:
+    python build.py                 # bring everything up to date
+    python build.py map --dry-run   # show what building map.html would run
+    python build.py --force outlets_crawl
+    python build.py --refresh-outlets   # weekly re-crawl, geocoding only what changed
+"""
+
+# %% Stages
+# Paths are relative to the project root. cwd is where the stage's script expects to run.
+STAGES = {
+    "outlets_crawl": {
+        "cwd": "data",
+        "module": "r_outletsdata",
+        "inputs": [],
+        "outputs": ["data/r_outletsdata.csv"],
+        "code": ["data/r_outletsdata.py"],
+        "external": True,
+    },
+    "outlets_geocode": {
+        "cwd": "data",
+        "module": "r2_outletgeocode",
+        "inputs": ["data/r_outletsdata.csv"],
+        "outputs": ["data/r2_outletgeocode.csv"],
+        "code": ["data/r2_outletgeocode.py"],
+        "external": True,
+    },
+    "outlets_check": {
+        "cwd": "data",
+        "module": "r2a_outletgeocode",
+        "inputs": ["data/r2_outletgeocode.csv"],
+        "outputs": [],
+        "code": ["data/r2a_outletgeocode.py", "helper_schema.py"],
+    },
+    "outlets_zones": {
+        "cwd": "data",
+        "module": "r2b_outletgeocode",
+        "inputs": ["data/r2_outletgeocode.csv", "data/r2_cleanboundary.geojson"],
+        "outputs": ["data/r2b_outletgeocode.csv"],
+        "code": [
+            "data/r2b_outletgeocode.py",
+            "helper_locator.py",
+            "helper_schema.py",
+            "helper_store.py",
+        ],
+        "after": ["outlets_check", "boundary_store"],
+    },
+    "zone_hierarchy": {
+        "cwd": "data",
+        "module": "r3_zonehierarchy",
+        "inputs": ["data/r2_cleanboundary.geojson", "data/r2b_outletgeocode.csv"],
+        "outputs": [
+            "data/r3_zonehierarchy.csv",
+            "data/r3_planningareas.csv",
+            "data/r3_regions.csv",
+        ],
+        "code": [
+            "data/r3_zonehierarchy.py",
+            "helper_whitespace.py",
+            "helper_schema.py",
+            "helper_store.py",
+        ],
+        "after": ["boundary_store"],
+    },
+    "boundary_download": {
+        "cwd": "data",
+        "module": "r_boundarydata",
+        "inputs": [],
+        "outputs": ["data/r_boundarydata.geojson"],
+        "code": ["data/r_boundarydata.py"],
+        "external": True,
+    },
+    "demographics_download": {
+        "cwd": "data",
+        "module": "r_demographicsdata",
+        "inputs": [],
+        "outputs": ["data/r_demographicsdata/manifest.json"],
+        "code": ["data/r_demographicsdata.py"],
+        "external": True,
+    },
+    "boundary_clean": {
+        "cwd": "data",
+        "module": "r2_cleanboundary",
+        "inputs": [
+            "data/r_boundarydata.geojson",
+            "data/r_demographicsdata/manifest.json",
+        ],
+        "outputs": [
+            "data/r2_cleanboundary.geojson",
+            "data/r2_cleanboundary_validity.json",
+        ],
+        "code": [
+            "data/r2_cleanboundary.py",
+            "helper_geometry.py",
+            "helper_schema.py",
+        ],
+    },
+    "boundary_store": {
+        "cwd": ".",
+        "module": "helper_store",
+        "inputs": ["data/r2_cleanboundary.geojson"],
+        "outputs": [],
+        "code": ["helper_store.py"],
+    },
+    "population_cube": {
+        "cwd": ".",
+        "module": "helper_popcube",
+        "inputs": ["data/r_demographicsdata/manifest.json"],
+        "outputs": [],
+        "code": ["helper_popcube.py", "helper_store.py"],
+    },
+    "boundary_levels": {
+        "cwd": ".",
+        "module": "helper_simplify",
+        "inputs": ["data/r2_cleanboundary.geojson"],
+        "outputs": [],
+        "code": ["helper_simplify.py", "helper_schema.py", "helper_store.py"],
+        "after": ["boundary_store"],
+    },
+    "zone_layers": {
+        "cwd": ".",
+        "module": "helper_zones",
+        "inputs": ["data/r2_cleanboundary.geojson"],
+        "outputs": [],
+        "code": [
+            "helper_zones.py",
+            "helper_simplify.py",
+            "helper_schema.py",
+            "helper_store.py",
+        ],
+        "after": ["boundary_store"],
+    },
+    "catchments": {
+        "cwd": ".",
+        "module": "helper_catchment",
+        "inputs": ["data/r2b_outletgeocode.csv", "data/r2_cleanboundary.geojson"],
+        "outputs": [],
+        "code": ["helper_catchment.py", "helper_schema.py", "helper_store.py"],
+        "after": ["boundary_store"],
+    },
+    "map": {
+        "cwd": ".",
+        "module": "helper_drawmap",
+        "inputs": ["data/r2_cleanboundary.geojson", "data/r2b_outletgeocode.csv"],
+        "outputs": ["map.html"],
+        "code": [
+            "helper_drawmap.py",
+            "helper_maplayers.py",
+            "helper_mapasset.py",
+            "helper_simplify.py",
+            "helper_whitespace.py",
+            "helper_metrics.py",
+            "helper_zones.py",
+            "helper_schema.py",
+        ],
+        "after": ["boundary_store", "boundary_levels", "zone_layers"],
+    },
+}
+
+# Delta refresh of the outlet branch, see data/r2c_outletrefresh.py. It writes the
+# outputs of the stages it stands in for, which are then recorded as up to date.
+REFRESH = {
+    "cwd": "data",
+    "module": "r2c_outletrefresh",
+    "replaces": ["outlets_geocode", "outlets_check", "outlets_zones"],
+}
+
+# %% Functions
+
+
+def _abs(path):
+    return os.path.join(ROOT_DIR, path)
+
+
+def dependencies(stages=STAGES):
+    """
+    Returns {stage: set of stages it waits on}, from matching inputs to outputs plus
+    any explicit "after" entries.
+    """
+    producers = {out: name for name, st in stages.items() for out in st["outputs"]}
+    deps = {}
+    for name, st in stages.items():
+        deps[name] = {producers[i] for i in st["inputs"] if i in producers}
+        deps[name].update(st.get("after", []))
+    return deps
+
+
+def selectStages(targets, deps):
+    """
+    Returns the targets plus everything upstream of them.
+    """
+    selected, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in selected:
+            selected.add(name)
+            todo.extend(deps[name])
+    return selected
+
+
+def localImports(path, seen=None):
+    """
+    Returns path (relative to the project root) and every project module it imports,
+    followed recursively. Modules are looked up next to the importing file, then in the
+    project root, anything else is a third party package and left out.
+    """
+    seen = set() if seen is None else seen
+    if path in seen:
+        return seen
+    seen.add(path)
+    with open(_abs(path)) as f:
+        tree = ast.parse(f.read(), filename=path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    for name in sorted(names):
+        for folder in (os.path.dirname(path), ""):
+            candidate = os.path.join(folder, f"{name}.py")
+            if os.path.isfile(_abs(candidate)):
+                localImports(candidate, seen)
+                break
+    return seen
+
+
+def stageCode(stage):
+    """
+    The stage's listed code plus every project module its script pulls in. External
+    stages only count their listed code.
+    """
+    script = os.path.normpath(os.path.join(stage["cwd"], f"{stage['module']}.py"))
+    code = set(stage["code"])
+    if not stage.get("external") and os.path.isfile(_abs(script)):
+        code |= localImports(script)
+    return sorted(code)
+
+
+def stageKey(stage):
+    """
+    Hash of the stage's input and code files. Missing inputs hash as missing.
+    """
+    h = hashlib.sha256()
+    for path in sorted(stage["inputs"]) + stageCode(stage):
+        digest = fileHash(_abs(path)) if os.path.isfile(_abs(path)) else "missing"
+        h.update(f"{path}:{digest}\n".encode())
+    return h.hexdigest()
+
+
+def readState():
+    path = cachePath("build_state.json")
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def writeState(state):
+    with open(cachePath("build_state.json"), "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def _outputsExist(stage):
+    return all(os.path.isfile(_abs(out)) for out in stage["outputs"])
+
+
+def _outputsNewer(stage):
+    """
+    Make-style check used only for stages that have never been recorded, so that files
+    already in the repo are adopted instead of rebuilt (or re-geocoded) on the first run.
+    """
+    if not stage["outputs"] or not _outputsExist(stage):
+        return False
+    paths = [_abs(p) for p in stage["inputs"] + stageCode(stage) if os.path.isfile(_abs(p))]
+    newest_input = max((os.path.getmtime(p) for p in paths), default=0)
+    return all(os.path.getmtime(_abs(out)) >= newest_input for out in stage["outputs"])
+
+
+def isStale(name, state, forced):
+    """
+    Returns (stale, key) for a stage given the recorded state.
+    """
+    stage = STAGES[name]
+    key = stageKey(stage)
+    if name in forced:
+        return True, key
+    if not _outputsExist(stage):
+        return True, key
+    if name not in state:
+        # Never re-fetch or re-geocode data that is already on disk just because the
+        # build has no record of it yet.
+        if stage.get("external"):
+            return False, key
+        return not _outputsNewer(stage), key
+    # Stages without inputs (the downloads) only go stale when their code changes.
+    return state[name] != key, key
+
+
+def runModule(cwd, module, func="main"):
+    """
+    Runs module.func() in its own working directory. Executed in a worker process.
+    """
+    cwd = _abs(cwd)
+    os.chdir(cwd)
+    sys.path.insert(0, cwd)
+    sys.path.insert(1, ROOT_DIR)
+    getattr(importlib.import_module(module), func)()
+
+
+def runStage(name):
+    stage = STAGES[name]
+    runModule(stage["cwd"], stage["module"], stage.get("func", "main"))
+    return name
+
+
+def plan(targets=None, forced=()):
+    """
+    Returns the stages that would run, in dependency order. A stage downstream of a stale
+    stage counts as stale.
+    """
+    deps = dependencies()
+    selected = selectStages(targets or STAGES, deps)
+    state = readState()
+    stale, order, done = set(), [], set()
+    while len(done) < len(selected):
+        for name in sorted(selected - done):
+            if deps[name] <= done:
+                if isStale(name, state, forced)[0] or deps[name] & stale:
+                    stale.add(name)
+                order.append(name)
+                done.add(name)
+    return [name for name in order if name in stale]
+
+
+def build(targets=None, forced=(), jobs=None):
+    """
+    Brings the targets (default: everything) up to date. Returns False if a stage failed.
+    """
+    deps = dependencies()
+    selected = selectStages(targets or STAGES, deps)
+    state = readState()
+    done, failed, running = set(), set(), {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while True:
+            for name in sorted(selected - done - failed - set(running.values())):
+                if deps[name] & failed:
+                    failed.add(name)
+                    print(f"[skip] {name}: upstream failed")
+                    continue
+                if not deps[name] <= done:
+                    continue
+                stale, key = isStale(name, state, forced)
+                if not stale:
+                    if name not in state:
+                        # Adopted from disk, remember it so later changes are noticed.
+                        state[name] = key
+                        writeState(state)
+                    done.add(name)
+                    print(f"[up to date] {name}")
+                    continue
+                print(f"[run] {name}")
+                running[pool.submit(runStage, name)] = name
+            if not running:
+                if selected - done - failed:
+                    # Newly unblocked stages are picked up on the next pass.
+                    continue
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except BaseException as e:
+                    failed.add(name)
+                    print(f"[failed] {name}: {e!r}")
+                    continue
+                # Key is taken after the run, the stage may have rewritten its own inputs.
+                state[name] = stageKey(STAGES[name])
+                writeState(state)
+                done.add(name)
+                print(f"[done] {name}")
+
+    return not failed
+
+
+def refreshOutlets(jobs=None):
+    """
+    Re-crawls the outlets and runs the delta refresh in place of the full geocode, check
+    and zone stages. Returns False if either failed.
+    """
+    if not build(["outlets_crawl"], forced=["outlets_crawl"], jobs=jobs):
+        return False
+    print("[run] outlets_refresh")
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        try:
+            pool.submit(runModule, REFRESH["cwd"], REFRESH["module"]).result()
+        except BaseException as e:
+            print(f"[failed] outlets_refresh: {e!r}")
+            return False
+    state = readState()
+    for name in REFRESH["replaces"]:
+        state[name] = stageKey(STAGES[name])
+    writeState(state)
+    print("[done] outlets_refresh")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Incremental build of the data pipeline and map."
+    )
+    parser.add_argument("targets", nargs="*", help=f"any of {', '.join(STAGES)}")
+    parser.add_argument("--force", nargs="+", default=[], help="stages to rerun anyway")
+    parser.add_argument("--dry-run", action="store_true", help="only list stale stages")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="parallel stages")
+    parser.add_argument(
+        "--refresh-outlets",
+        action="store_true",
+        help="re-crawl and only geocode new or changed outlets before building",
+    )
+    args = parser.parse_args()
+
+    unknown = set(args.targets + args.force) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    if args.dry_run:
+        for name in plan(args.targets, args.force):
+            print(name)
+        return
+    if args.refresh_outlets and not refreshOutlets(args.jobs):
+        sys.exit(1)
+    if not build(args.targets, args.force, args.jobs):
+        sys.exit(1)
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
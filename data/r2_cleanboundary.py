@@ -3,13 +3,22 @@ import geopandas as gpd
 import pandas as pd
 import numpy as np
 import os
+import sys
+import json
+from r_demographicsdata import load_years
+
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_geometry import normalize, validityStats
+from helper_schema import validate
 
 """ 
 Takes the converted geojson file and returns columns of interest
 - Subzone
 - Planning area
 - Region
-- Geometry data (important for choropleths)
+- Geometry data (important for choropleths), repaired and reduced to (Multi)Polygons
+  once here so the map and table builds can use the shapes as they are
 """
 # %% Functions
 
@@ -35,13 +44,32 @@ def getArea(file):
     # epsg 6933 for an equal area estimation
     gdf = gdf.to_crs(epsg=6933)
     gdf = gdf[cols]
+    gdf = normalizeGeometry(gdf, "./r2_cleanboundary_validity.json")
     gdf["area_km2"] = gdf.area / 10 ** 6
     return gdf
 
 
-def getPopulation(file):
-    df = pd.read_csv(file)
-    df["SZ"] = df["SZ"].str.upper()
+def normalizeGeometry(gdf, statsfn):
+    # Repairs invalid shapes and turns GeometryCollections (JURONG ISLAND AND BUKOM) into
+    # MultiPolygons, which GeoJSON tooltips and GEOS predicates can handle.
+    before = list(gdf.geometry)
+    after = [normalize(geom) for geom in before]
+    stats = validityStats(before, after)
+    stats["invalid_after"] = sum(
+        1 for geom in after if geom is not None and not geom.is_valid
+    )
+    gdf = gdf.copy()
+    gdf["geometry"] = gpd.GeoSeries(after, index=gdf.index, crs=gdf.crs)
+    with open(statsfn, "w") as f:
+        json.dump(stats, f, indent=2)
+    print(f"Geometry normalized: {stats}")
+    return gdf
+
+
+def getPopulation(folder, year=2020):
+    # Reads only that year's partition of the demographics store
+    df = load_years(folder, [year])
+    df["SZ"] = df["SZ"].astype(str).str.upper()
     df = df[["SZ", "Pop"]].groupby("SZ", as_index=False).sum()
     return df
 
@@ -55,6 +83,8 @@ def mergeAndWrite(df1, df2, outputfn):
     mdf.drop(columns=["sz"], inplace=True)
     # Decision to cast density as int because float doesn't add value to the conversation
     mdf["pop_density/km2"] = round(mdf["pop"] / mdf["area_km2"], 0).astype(int)
+    # Checked but written untyped, the file keeps full precision areas
+    validate(mdf, "boundary")
     # exports this to a processed geojson file
     if os.path.isfile(outputfn):
         os.remove(outputfn)
@@ -65,7 +95,7 @@ def mergeAndWrite(df1, df2, outputfn):
 
 def main():
     gdf = getArea("./r_boundarydata.geojson")
-    popdf = getPopulation("./r_demographicsdata.csv")
+    popdf = getPopulation("./r_demographicsdata")
     outputfn = "./r2_cleanboundary.geojson"
     mergeAndWrite(gdf, popdf, outputfn)
 
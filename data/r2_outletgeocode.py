@@ -1,13 +1,19 @@
 # %% Import libraries
 import pandas as pd
+import numpy as np
 import re
 import os
+import sys
 from ast import literal_eval
-from geopy import GoogleV3
 
 # You'll have to use your own credentials!
 from credentials import google_api_key
 
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_geocode import GoogleBackend, batchGeocode, geocodeOutlet
+from helper_schema import castFrame, readTable
+
 """ 
 Takes the raw outlet data and returns a cleaned up df with 4 columns
 - brand
@@ -26,7 +32,7 @@ def clean(file):
 
     Please note. There is an additional step here where dropna is used.
     """
-    df = pd.read_csv(file)
+    df = readTable("outlets_raw", file)
 
     def _getPostalCode(row):
         """
@@ -55,30 +61,32 @@ def clean(file):
     return df
 
 
-def getGeoCodeGoogle(addr, postalcode):
+def getGeoCodeGoogle(addr, postalcode, backend=None):
     """
     Takes addr and postal code from df to return [addr, (lat, lng)]
     - Search postalcode first, then addr if it fails.
     - Split the postal code to just numbers since region is already specified.
+    Single uncached lookup, batches should go through geocodeAll.
     """
-    geoObj = GoogleV3(api_key=google_api_key)
-    postalcode = postalcode.split()[-1]
-    result = geoObj.geocode(postalcode, region="sg")
-    if result != None:
-        print(f"{postalcode} found.")
-        return (result[0], result[1])
-    else:
-        print("Postalcode didn't work, using addr instead.")
-        result = geoObj.geocode(addr, region="sg")
-        print(f"{addr} found.")
-        return (result[0], result[1])
+    backend = backend or GoogleBackend(google_api_key)
+    return geocodeOutlet(backend, postalcode, addr)
+
+
+def geocodeAll(df, backend=None):
+    """
+    Geocodes every outlet in df through the on-disk cache, only new outlets hit the API.
+    Outlets that can't be found at all get None.
+    """
+    backend = backend or GoogleBackend(google_api_key)
+    return batchGeocode(df["postalcode"].tolist(), df["address"].tolist(), backend)
 
 
 def furtherProcessing(df):
-    # Splitting up the results of the GeoCode
-    df["retaddr"] = df["geocode"].apply(lambda x: x[0])
-    df["lat"] = df["geocode"].apply(lambda x: x[1][0])
-    df["lng"] = df["geocode"].apply(lambda x: x[1][1])
+    # Splitting up the results of the GeoCode, outlets that weren't found are left blank
+    # and will be flagged by r2a_outletgeocode.
+    df["retaddr"] = df["geocode"].apply(lambda x: x[0] if x else np.nan)
+    df["lat"] = df["geocode"].apply(lambda x: x[1][0] if x else np.nan)
+    df["lng"] = df["geocode"].apply(lambda x: x[1][1] if x else np.nan)
     df.drop(columns=["geocode"], inplace=True)
     return df
 
@@ -96,15 +104,13 @@ def main():
 
     # Apply the geocode function
     df = clean(filename)
-    df["geocode"] = df.apply(
-        lambda x: getGeoCodeGoogle(x["address"], x["postalcode"]), axis=1
-    )
+    df["geocode"] = geocodeAll(df)
     df = furtherProcessing(df)
 
-    saveFile(df, outputfn)
-    os.system("pause")
+    saveFile(castFrame(df, "outlets_geocoded"), outputfn)
 
 
 # %% Main
 if __name__ == "__main__":
     main()
+    os.system("pause")
@@ -1,19 +1,38 @@
 # %% Import libraries
 import os
+import sys
 import pandas as pd
-import re
 from geopy import GoogleV3
 from credentials import google_api_key
 from r2_outletgeocode import getGeoCodeGoogle
 
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_schema import POSTAL_PATT, readTable
+
 """ 
 Check returned geocode data against original postal code. Makes a lot of noise if something
 went wrong.
+The weekly refresh (r2c_outletrefresh.py) runs the same comparison on the new rows only
+and quarantines the ones that fail instead of stopping.
 """
 
 # %% Functions
 
 
+def postalStatus(postalcodes, retaddrs):
+    """
+    Compares each outlet's postal code with the one in its geocoded address, in one pass.
+    Returns 1 where they match, 0 where they don't and "manualcheck" where the geocoded
+    address has none (or the geocoder found nothing).
+    """
+    found = retaddrs.astype(str).str.extract(f"({POSTAL_PATT})", expand=False)
+    status = pd.Series(0, index=retaddrs.index, dtype=object)
+    status[found == postalcodes] = 1
+    status[found.isna()] = "manualcheck"
+    return status
+
+
 def check(filename):
     """
     Returns a df with latlng columns and a list of problematic indexes
@@ -22,19 +41,8 @@ def check(filename):
     - If errors are found, print out the offending rows and stops the script.
     - Returns a df if no errors are found.
     """
-    df = pd.read_csv(filename)
-
-    def _checkMatch(ori, ret):
-        patt = r"Singapore \d{6}"
-        mo = re.search(patt, ret)
-        if not mo:
-            return "manualcheck"
-        elif mo.group() == ori:
-            return 1
-        else:
-            return 0
-
-    df["check"] = df.apply(lambda x: _checkMatch(x["postalcode"], x["retaddr"]), axis=1)
+    df = readTable("outlets_geocoded", filename)
+    df["check"] = postalStatus(df["postalcode"], df["retaddr"])
     # This tells the script what to search for
     err_df = df[df["check"] != 1]
     err_index_list = err_df.index.to_list()
@@ -51,7 +59,6 @@ def check(filename):
         print(
             "Exiting programme now, please fix the issues shown here before continuing."
         )
-        os.system("pause")
         raise SystemExit()
     df.drop(columns=["check"], inplace=True)
     return df
@@ -61,9 +68,11 @@ def main():
     filename = "./r2_outletgeocode.csv"
     check(filename)
     print("Postal codes were checked and no issues found, please proceed to next step.")
-    os.system("pause")
 
 
 # %% Main
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        os.system("pause")
\ No newline at end of file
@@ -1,7 +1,12 @@
 # %% Import libraries
-import geopandas as gpd
 import pandas as pd
 import os
+import sys
+
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_locator import getLocator
+from helper_schema import castFrame, readTable
 
 """ 
 Last step in processing the outlet data. 
@@ -11,15 +16,11 @@ Last step in processing the outlet data.
 # %% Functions
 
 
-def appendZoneInfo(df, geodf):
-    # Create a geometry point from the lat-lng coords.
-    # To note, pointsfromxy takes long and lat instead,
-    # and we must use a starting CRS projects long lat.
-    df = gpd.GeoDataFrame(df, geometry=gpd.points_from_xy(df.lng, df.lat, crs=4326))
-    # At this point we must convert CRS to 6933 because geojson is in that format
-    df = df.to_crs(epsg=6933)
-
-    mDF = gpd.sjoin(df, geodf, how="left", op="within")
+def appendZoneInfo(df, locator):
+    # Look up the zones of every outlet from its lat-lng coords in one go.
+    # The locator indexes the subzone polygons once, see helper_locator.
+    zones = locator.locate(df["lat"], df["lng"])
+    mDF = pd.concat([df.reset_index(drop=True), zones], axis=1)
     cols = [
         "brand",
         "postalcode",
@@ -32,14 +33,14 @@ def appendZoneInfo(df, geodf):
         "region_n",
     ]
 
-    return mDF[cols]
+    return castFrame(mDF[cols], "outlets")
 
 
 def main():
-    outletsDF = pd.read_csv("./r2_outletgeocode.csv")
-    geoDF = gpd.read_file("./r2_cleanboundary.geojson")
+    outletsDF = readTable("outlets_geocoded", "./r2_outletgeocode.csv")
+    locator = getLocator("./r2_cleanboundary.geojson")
 
-    df = appendZoneInfo(outletsDF, geoDF)
+    df = appendZoneInfo(outletsDF, locator)
 
     filename = "./r2b_outletgeocode.csv"
     if os.path.isfile(filename):
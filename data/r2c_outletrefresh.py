@@ -0,0 +1,154 @@
+# %% Import libraries
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_geocode import normalizeKeys
+from helper_locator import getLocator
+from helper_schema import LAT_RANGE, LNG_RANGE, castFrame, readTable
+from r2_outletgeocode import clean, furtherProcessing, geocodeAll, saveFile
+from r2a_outletgeocode import postalStatus
+from r2b_outletgeocode import appendZoneInfo
+
+"""
+Weekly refresh of the outlet data, only touching what the new crawl changed.
+- The crawl is diffed against the last r2b_outletgeocode.csv on brand plus the
+  normalized postal code and address (helper_geocode.normalizeKey).
+- Outlets seen before keep their coords and zones. Added and changed ones are geocoded
+  through the sqlite cache, checked with vectorized string ops and tagged with their
+  zones, so a refresh costs a handful of API calls.
+- Rows that fail a check go to r2_quarantine.csv with the reason instead of stopping the
+  run. They aren't kept, so the next refresh looks at them again.
+Writes r2_outletgeocode.csv and r2b_outletgeocode.csv like the full run.
+Use python build.py --refresh-outlets so everything downstream is rebuilt after it.
+"""
+
+# %% Constants
+CRAWL_FILE = "./r_outletsdata.csv"
+GEOCODE_FILE = "./r2_outletgeocode.csv"
+ZONED_FILE = "./r2b_outletgeocode.csv"
+BOUNDARY_FILE = "./r2_cleanboundary.geojson"
+QUARANTINE_FILE = "./r2_quarantine.csv"
+# Columns taken from the crawl, the rest come from the previous files or the lookups
+CRAWL_COLS = ["brand", "postalcode", "address"]
+
+# %% Functions
+
+
+def outletKeys(df):
+    return df["brand"].astype(str) + "|" + normalizeKeys(df["postalcode"], df["address"])
+
+
+def brandPostal(df):
+    """
+    Brand plus postal code, the part of the key an outlet keeps when its address changes.
+    """
+    postal = df["postalcode"].astype(str).str.extract(r"(\d{6})", expand=False)
+    return df["brand"].astype(str) + "|" + postal.fillna("")
+
+
+def loadPrevious(filename, dataset):
+    """
+    Returns the last run's outlets with their keys, empty before the first full run.
+    """
+    if not os.path.isfile(filename):
+        return pd.DataFrame(columns=CRAWL_COLS + ["key"])
+    df = readTable(dataset, filename)
+    return df.assign(key=outletKeys(df)).drop_duplicates("key")
+
+
+def keptRows(crawl, previous):
+    """
+    The crawl's rows with the columns the previous file holds for them.
+    """
+    return crawl.merge(previous.drop(columns=CRAWL_COLS), on="key", how="left")
+
+
+def failureReasons(df):
+    """
+    Returns why each geocoded row can't be used, empty where it can.
+    """
+    status = postalStatus(df["postalcode"], df["retaddr"])
+    inside = df["lat"].between(*LAT_RANGE) & df["lng"].between(*LNG_RANGE)
+    reasons = np.select(
+        [
+            df["lat"].isna().to_numpy(),
+            ~inside.to_numpy(),
+            (status == "manualcheck").to_numpy(),
+            (status == 0).to_numpy(),
+        ],
+        [
+            "not found",
+            "outside Singapore",
+            "no postal code in the geocoded address",
+            "postal code mismatch",
+        ],
+        default="",
+    )
+    return pd.Series(reasons, index=df.index)
+
+
+def refresh(crawl, geocoded, zoned, locator, geocode=geocodeAll):
+    """
+    Returns the new geocoded and zoned outlet tables and the quarantined rows.
+    geocode(df) returns one geocoder result per row, see r2_outletgeocode.geocodeAll.
+    """
+    crawl = crawl.assign(key=outletKeys(crawl), order=np.arange(len(crawl)))
+    known = crawl["key"].isin(geocoded["key"]) & crawl["key"].isin(zoned["key"])
+    fresh = crawl[~known].copy()
+    # A changed outlet keeps its brand and postal code but not its address. Another
+    # brand opening in the same mall is a new outlet.
+    changed = brandPostal(fresh).isin(brandPostal(zoned))
+    removed = ~geocoded["key"].isin(crawl["key"])
+    print(
+        f"{known.sum()} outlets unchanged, {changed.sum()} changed, "
+        f"{(~changed).sum()} added, {removed.sum()} gone."
+    )
+
+    if len(fresh):
+        fresh["geocode"] = geocode(fresh)
+        fresh = furtherProcessing(fresh)
+    else:
+        fresh = fresh.assign(retaddr=None, lat=np.nan, lng=np.nan)
+    reasons = failureReasons(fresh)
+    passed = fresh[reasons == ""]
+    quarantined = fresh[reasons != ""].assign(reason=reasons[reasons != ""])
+
+    geocode_cols = CRAWL_COLS + ["retaddr", "lat", "lng"]
+    new_geocoded = pd.concat([keptRows(crawl[known], geocoded), passed])
+    new_geocoded = new_geocoded.sort_values("order")[geocode_cols]
+    tagged = appendZoneInfo(passed, locator).assign(order=passed["order"].to_numpy())
+    new_zoned = pd.concat([keptRows(crawl[known], zoned), tagged])
+    new_zoned = new_zoned.sort_values("order")[list(tagged.columns.drop("order"))]
+    return (
+        castFrame(new_geocoded.reset_index(drop=True), "outlets_geocoded"),
+        castFrame(new_zoned.reset_index(drop=True), "outlets"),
+        quarantined.drop(columns=["key", "order"]),
+    )
+
+
+def main():
+    crawl = clean(CRAWL_FILE)
+    geocoded = loadPrevious(GEOCODE_FILE, "outlets_geocoded")
+    zoned = loadPrevious(ZONED_FILE, "outlets")
+    new_geocoded, new_zoned, quarantined = refresh(
+        crawl, geocoded, zoned, getLocator(BOUNDARY_FILE)
+    )
+    saveFile(new_geocoded, GEOCODE_FILE)
+    saveFile(new_zoned, ZONED_FILE)
+    if len(quarantined):
+        saveFile(quarantined, QUARANTINE_FILE)
+        print(f"{len(quarantined)} outlets quarantined, see {QUARANTINE_FILE}.")
+    elif os.path.isfile(QUARANTINE_FILE):
+        # Nothing failed this time, don't leave last week's list lying around
+        os.remove(QUARANTINE_FILE)
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
+    os.system("pause")
@@ -0,0 +1,91 @@
+# %% Import libraries
+import pandas as pd
+import os
+import sys
+
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_schema import castFrame, loadBoundary, readTable
+from helper_whitespace import whitespaceScores
+
+"""
+Attribute-only zone hierarchy, subzone -> planning area -> region.
+- One row per subzone with its planning area and region, area, population, outlet
+  counts per brand and whitespace score. No geometry is kept.
+- The same figures summed up per planning area and per region, with the density
+  worked out again from the summed population and area.
+The summary table reads the planning area file as is, nothing downstream dissolves.
+"""
+
+# %% Constants
+KEYS = ["subzone_n", "pln_area_n", "region_n"]
+SUMMED = ["area_km2", "pop", "whitespace"]
+# Outlet count columns are the brand name behind this prefix
+BRAND_PREFIX = "outlets_"
+# Output file and its helper_schema dataset per level
+LEVELS = {
+    "subzone_n": ("./r3_zonehierarchy.csv", "subzones"),
+    "pln_area_n": ("./r3_planningareas.csv", "planning_areas"),
+    "region_n": ("./r3_regions.csv", "regions"),
+}
+
+# %% Functions
+
+
+def outletCounts(outletfn):
+    # Outlets outside every subzone have no zone to be counted in
+    df = readTable("outlets", outletfn, columns=["brand", "subzone_n"]).dropna()
+    counts = pd.crosstab(df["subzone_n"], df["brand"])
+    counts.columns = [BRAND_PREFIX + brand for brand in counts.columns]
+    return counts.reset_index()
+
+
+def buildHierarchy(boundaryfn, outletfn):
+    # Geometry is only decoded for the whitespace points, then dropped
+    gdf = loadBoundary(boundaryfn, columns=KEYS + ["area_km2", "pop"])
+    scores = whitespaceScores(gdf, readTable("outlets", outletfn), brands=[])
+    df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    df = df.merge(
+        scores[["subzone_n", "score"]].rename(columns={"score": "whitespace"}),
+        how="left",
+        on="subzone_n",
+    )
+    df = df.merge(outletCounts(outletfn), how="left", on="subzone_n")
+    brand_cols = [c for c in df.columns if c.startswith(BRAND_PREFIX)]
+    df[brand_cols] = df[brand_cols].fillna(0).astype(int)
+    df["whitespace"] = df["whitespace"].fillna(0).astype(int)
+    return df
+
+
+def aggregate(df, level):
+    """
+    Sums the subzone rows up to level (pln_area_n or region_n).
+    """
+    keys = KEYS[KEYS.index(level) :]
+    summed = SUMMED + [c for c in df.columns if c.startswith(BRAND_PREFIX)]
+    # observed=True, the keys are categoricals and every other combination is empty.
+    # pandas 1.x can then return the groups in order of appearance, hence the sort.
+    grouped = df.groupby(keys, as_index=False, sort=True, observed=True)
+    return grouped[summed].sum().sort_values(keys, ignore_index=True)
+
+
+def addDensity(df):
+    df["pop_density/km2"] = (df["pop"] / df["area_km2"]).round(0).astype(int)
+    return df
+
+
+def main():
+    df = buildHierarchy("./r2_cleanboundary.geojson", "./r2b_outletgeocode.csv")
+    for level, (outputfn, dataset) in LEVELS.items():
+        out = df if level == "subzone_n" else aggregate(df, level)
+        out = castFrame(addDensity(out.copy()), dataset)
+        if os.path.isfile(outputfn):
+            os.remove(outputfn)
+        out.to_csv(outputfn, index=False)
+        print(f"{len(out)} rows written to {outputfn}.")
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
+    os.system("pause")
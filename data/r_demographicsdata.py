@@ -1,59 +1,143 @@
 # %% Import
 import requests
 import os
+import sys
+import json
+import shutil
 from zipfile import ZipFile
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
 
-""" 
-- Goes to the url, downloads the zip file found there and saves it.
-- Extracts targetfn into the folder then deletes zip file.
-- Filters based on the year I set. Only allow 1 year for now.
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_store import readFrame, writeFrame
+
+"""
+- Goes to the url and streams the zip file found there to disk.
+- Reads the csv straight out of the zip in chunks, only the columns and years needed.
+  Text columns are parsed as categories and each chunk is spilled to disk per year
+  straight away, so memory holds one chunk while reading and one year while merging.
+- Writes one columnar partition per year, so any set of years can be loaded later
+  without going back to the csv.
 """
 
+# %% Constants
+COLUMNS = ["PA", "SZ", "AG", "Sex", "TOD", "Pop", "Time"]
+CATEGORICAL = ["PA", "SZ", "AG", "Sex", "TOD"]
+DTYPES = {
+    **{col: "category" for col in CATEGORICAL},
+    "Pop": np.int32,
+    "Time": np.int16,
+}
+
 # %% Functions
 
 
-def download_extract(inputurl, targetfn):
-    response = requests.get(inputurl)
-    archivefn = "demographics.zip"
-    with open(archivefn, "wb") as f:
-        f.write(response.content)
+def download(inputurl, archivefn, chunksize=1 << 20):
+    with requests.get(inputurl, stream=True) as response:
+        response.raise_for_status()
+        with open(archivefn, "wb") as f:
+            for chunk in response.iter_content(chunk_size=chunksize):
+                f.write(chunk)
     print(
-        "Zip file has been downloaded from {} and renamed as {}.".format(
+        "Zip file has been downloaded from {} and saved as {}.".format(
             inputurl, archivefn
         )
     )
 
-    zipped = ZipFile(archivefn)
-    zipped.extract(targetfn)
-    zipped.close()
-    print("{} has been extracted.".format(targetfn))
-    os.remove(archivefn)
-    print("{} has been deleted.".format(archivefn))
 
+def spill_chunks(archivefn, targetfn, years, spilldir, chunksize=100_000):
+    """
+    Reads targetfn inside the zip without extracting it and writes each chunk's rows of
+    every year to its own store under spilldir. Returns {year: [part folders]}.
+    """
+    parts = {year: [] for year in years}
+    with ZipFile(archivefn) as zipped, zipped.open(targetfn) as member:
+        reader = pd.read_csv(member, usecols=COLUMNS, dtype=DTYPES, chunksize=chunksize)
+        for i, chunk in enumerate(reader):
+            chunk = chunk[chunk["Time"].isin(years)]
+            for year, df in chunk.groupby("Time"):
+                folder = os.path.join(
+                    spilldir, "year={}".format(year), "part-{}".format(i)
+                )
+                writeFrame(df.reset_index(drop=True), folder)
+                parts[year].append(folder)
+    return parts
+
+
+def merge_year(folders, outputfn):
+    """
+    Combines one year's spilled chunks into its partition. Returns the rows written.
+    Each chunk has its own categories, union_categoricals keeps the columns categorical.
+    """
+    dfs = [readFrame(folder) for folder in folders]
+    df = pd.DataFrame(
+        {
+            col: union_categoricals([d[col] for d in dfs])
+            if col in CATEGORICAL
+            else np.concatenate([d[col].to_numpy() for d in dfs])
+            for col in COLUMNS
+        }
+    )
+    writeFrame(df, outputfn)
+    return len(df)
 
-def filterDataSave(targetfn, years, outputfn):
-    df = pd.read_csv(targetfn)
-    df = df[df["Time"].isin(years)].reset_index(drop=True)
-    df.to_csv(outputfn, index=False)
-    print("{} is saved with only the years {}".format(outputfn, years))
+
+def read_years(archivefn, targetfn, years, outputdir, chunksize=100_000):
+    """
+    Writes one store per year under outputdir/year=<year>, one year in memory at a time.
+    Returns the years that had rows.
+    """
+    spilldir = os.path.join(outputdir, "_spill")
+    shutil.rmtree(spilldir, ignore_errors=True)
+    parts = spill_chunks(archivefn, targetfn, years, spilldir, chunksize)
+    written = []
+    for year, folders in parts.items():
+        if not folders:
+            print("No rows found for {}.".format(year))
+            continue
+        rows = merge_year(folders, os.path.join(outputdir, "year={}".format(year)))
+        print("{} rows written for {}.".format(rows, year))
+        written.append(year)
+    shutil.rmtree(spilldir, ignore_errors=True)
+    return written
+
+
+def write_partitions(years, outputdir):
+    """
+    Finishes outputdir with the manifest of the years read_years wrote.
+    """
+    with open(os.path.join(outputdir, "manifest.json"), "w") as f:
+        json.dump({"years": sorted(int(y) for y in years)}, f)
+
+
+def load_years(outputdir, years=None):
+    """
+    Returns the partitions for years (default: all of them) as one df.
+    """
+    if years is None:
+        with open(os.path.join(outputdir, "manifest.json")) as f:
+            years = json.load(f)["years"]
+    dfs = [readFrame(os.path.join(outputdir, "year={}".format(y))) for y in years]
+    return pd.concat(dfs, ignore_index=True)
 
 
 def main():
     inputurl = "https://www.singstat.gov.sg/-/media/files/find_data/population/statistical_tables/singapore-residents-by-planning-areasubzone-age-group-sex-and-type-of-dwelling-june-20112020.zip"
     targetfn = "respopagesextod2011to2020.csv"
-    outputfn = "r_demographicsdata.csv"
+    archivefn = "demographics.zip"
+    outputdir = "r_demographicsdata"
 
-    years = [2020]
-    # If output file exists, get rid of it.
-    if os.path.isfile(outputfn):
-        os.remove(outputfn)
+    years = list(range(2011, 2021))
 
-    download_extract(inputurl, targetfn)
-    filterDataSave(targetfn, years, outputfn)
+    download(inputurl, archivefn)
+    os.makedirs(outputdir, exist_ok=True)
+    written = read_years(archivefn, targetfn, years, outputdir)
+    write_partitions(written, outputdir)
     # Clean up the intermediate file
-    os.remove(targetfn)
+    os.remove(archivefn)
+    print("{} has been deleted.".format(archivefn))
 
 
 # %% Main
@@ -3,20 +3,72 @@ import numpy as np
 import pandas as pd
 import requests
 import os
+import sys
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared helpers live in the project root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helper_cache import cachePath
 
 """ 
 Takes a dictionary of relevant brands and their URLs and returns a raw csv file
+- Pages are fetched concurrently over one pooled session, a few at a time per host.
+- Each page's ETag / Last-Modified and parsed rows are cached, unchanged pages come
+  back as 304 and skip BeautifulSoup entirely.
 """
 # %% Functions
 
 
-def outlets_crawl(brand, url):
+def make_session(pool_size=8):
     """
-    Returns a raw, unformatted df of outlets with it's brand from the url inserted
+    Returns a session with pooled keep-alive connections and retries on server errors.
+    """
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _cache_file(url):
+    name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    return cachePath("crawl", f"{name}.json")
+
+
+def _read_cache(url):
+    path = _cache_file(url)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_cache(url, response, rows):
+    entry = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "rows": rows,
+    }
+    with open(_cache_file(url), "w") as f:
+        json.dump(entry, f)
+
+
+def parse_outlets(content):
+    """
+    Returns the stripped strings of every outlet listed on a brand page
     """
-    page = requests.get(url)
-    soup = BeautifulSoup(page.content, "lxml")
+    soup = BeautifulSoup(content, "lxml")
 
     # ensure crawler had actual results to work with.
     def _check_results(class_term, soup=soup):
@@ -34,22 +86,63 @@ def outlets_crawl(brand, url):
     _ls = []
     for result in results:
         _ls.append([i for i in result.stripped_strings])
+    return _ls
+
 
-    df = pd.DataFrame(_ls)
+def fetch_outlets(url, session, use_cache=True):
+    """
+    Returns the parsed rows of a brand page, revalidating the cached copy if there is one.
+    """
+    cached = _read_cache(url) if use_cache else None
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    page = session.get(url, headers=headers, timeout=30)
+    if page.status_code == 304 and cached:
+        return cached["rows"]
+    page.raise_for_status()
+    rows = parse_outlets(page.content)
+    _write_cache(url, page, rows)
+    return rows
+
+
+def outlets_crawl(brand, url, session=None, use_cache=True):
+    """
+    Returns a raw, unformatted df of outlets with it's brand from the url inserted
+    """
+    rows = fetch_outlets(url, session or make_session(), use_cache)
+    df = pd.DataFrame(rows)
     df.insert(0, "brand", brand, allow_duplicates=True)
     return df
 
 
-def loop_outlets_crawl(dict, outputfn):
+def loop_outlets_crawl(dict, outputfn, workers=4, per_host=2, use_cache=True):
     """
-    Loops outlets_crawl func through a dictionary of urls and their brands. Returns a concatenated df and saves it as a temporary csv.
+    Runs outlets_crawl through a dictionary of urls and their brands on a thread pool.
+    Returns a concatenated df (in the dictionary's order) and saves it as a temporary csv.
     """
-    _ls = []
-    for brand, url in dict.items():
-        _ls.append(outlets_crawl(brand, url))
+    session = make_session(pool_size=workers)
+    host_limits = {
+        host: threading.BoundedSemaphore(per_host)
+        for host in {urlparse(url).netloc for url in dict.values()}
+    }
+
+    def _crawl(brand, url):
+        with host_limits[urlparse(url).netloc]:
+            df = outlets_crawl(brand, url, session, use_cache)
         print(f"{brand} done.")
+        return df
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_crawl, brand, url) for brand, url in dict.items()]
+        _ls = [future.result() for future in futures]
     df = pd.concat(_ls)
     df.to_csv(outputfn, index=False)
+    return df
 
 
 def main():
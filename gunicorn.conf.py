@@ -0,0 +1,22 @@
+# %% Import libraries
+import gc
+import os
+
+"""
+Gunicorn settings for the Heroku dyno, picked up by the Procfile.
+- preload_app imports app.py once in the master, so the summary table and the map
+  asset are loaded before forking and shared copy-on-write by every worker.
+"""
+
+# %% Settings
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+bind = "0.0.0.0:" + os.environ.get("PORT", "8000")
+
+
+# %% Hooks
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach. Otherwise the first
+    # collection in each worker touches every object and un-shares their pages.
+    gc.freeze()
+    server.log.info("Preloaded app frozen before forking workers.")
@@ -1,46 +1,63 @@
 # %% Import libraries
+import hashlib
+from functools import lru_cache
+
 import pandas as pd
 import numpy as np
 
-# %% Original Blue function
+# %% Constants
+BAR_SUFFIX = " (bar)"
+N_STEPS = 100
 
+# %% Data bars
+# Adapted from the data bars example in Dash's documentation. Instead of one filter_query
+# range per percentile, every row's bar width is worked out here in one vectorized pass
+# and stored in a helper column, and only the widths that actually occur get a rule.
 
-def data_bars(df, column):
-    n_bins = 100
-    bounds = [i * (1.0 / n_bins) for i in range(n_bins + 1)]
-    ranges = [
-        ((df[column].max() - df[column].min()) * i) + df[column].min() for i in bounds
-    ]
+_step_cache = {}
+
+
+def bar_steps(values, n_steps=N_STEPS):
+    """
+    Returns the bar width of each value in steps of 100 / n_steps percent, 0 for an
+    empty bar and -1 for missing values.
+    Memoized on the values themselves, the table rarely changes between calls.
+    """
+    values = np.ascontiguousarray(values, dtype=float)
+    key = (hashlib.sha1(values.tobytes()).hexdigest(), n_steps)
+    if key not in _step_cache:
+        if len(_step_cache) >= 64:
+            _step_cache.clear()
+        lo, hi = np.nanmin(values), np.nanmax(values)
+        frac = (values - lo) / (hi - lo) if hi > lo else np.ones_like(values)
+        # Same bins as the original filter queries: [lo, lo + range / n_steps) is the
+        # first step and the maximum falls in the last. Zero draws an empty bar.
+        steps = np.clip(np.floor(frac * n_steps) + 1, 1, n_steps)
+        steps[values == 0] = 0
+        _step_cache[key] = np.nan_to_num(steps, nan=-1).astype(np.int8)
+    return _step_cache[key]
+
+
+def add_bar_column(df, column, n_steps=N_STEPS):
+    """
+    Returns a copy of df with the hidden bar width column for column added.
+    """
+    df = df.copy()
+    df[column + BAR_SUFFIX] = bar_steps(df[column].to_numpy(), n_steps)
+    return df
+
+
+@lru_cache(maxsize=64)
+def _bar_rules(column, steps, n_steps):
     styles = []
-    for i in range(1, len(bounds)):
-        min_bound = ranges[i - 1]
-        max_bound = ranges[i]
-        max_bound_percentage = bounds[i] * 100
+    for step in steps:
+        max_bound_percentage = step * 100 / n_steps
         styles.append(
             {
                 "if": {
-                    "filter_query": (
-                        "{{{column}}} >= {min_bound}"
-                        + (
-                            " && {{{column}}} < {max_bound}"
-                            if (i < len(bounds) - 1)
-                            else ""
-                        )
-                    ).format(column=column, min_bound=min_bound, max_bound=max_bound),
+                    "filter_query": "{{{}}} = {}".format(column + BAR_SUFFIX, step),
                     "column_id": column,
                 },
-                #### ------------- Original colors of Blue databar
-                # "background": (
-                #     """
-                #     linear-gradient(90deg,
-                #     #0074D9 0%,
-                #     #0074D9 {max_bound_percentage}%,
-                #     white {max_bound_percentage}%,
-                #     white 100%)
-                # """.format(
-                #         max_bound_percentage=max_bound_percentage
-                #     )
-                # ),
                 #### ------------- Changed to color red.
                 "background": (
                     """
@@ -57,6 +74,29 @@ def data_bars(df, column):
                 "paddingTop": 2,
             }
         )
-
     return styles
 
+
+def data_bars(df, column, n_steps=N_STEPS):
+    """
+    Returns one style rule per bar width present in df. Needs add_bar_column first.
+    """
+    steps = tuple(int(s) for s in np.unique(df[column + BAR_SUFFIX]) if s >= 0)
+    return list(_bar_rules(column, steps, n_steps))
+
+
+def highlight_nonzero(columns):
+    """
+    Returns one rule per column colouring every non-zero cell.
+    """
+    return [
+        {
+            "if": {
+                "filter_query": "{{{}}} != 0".format(col),
+                "column_id": col,
+            },
+            "backgroundColor": "darkorange",
+            "color": "white",
+        }
+        for col in columns
+    ]
@@ -0,0 +1,42 @@
+# %% Import libraries
+import hashlib
+import os
+
+"""
+Shared location and fingerprinting for build artifacts.
+Everything written here can be deleted at any time and will be rebuilt on demand.
+"""
+
+# %% Constants
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(ROOT_DIR, "data", "cache")
+
+# %% Functions
+
+
+def cachePath(*parts):
+    """
+    Returns a path inside the cache folder, creating the parent folders on the way.
+    """
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def fileHash(filename, chunksize=1 << 20):
+    """
+    Returns the sha256 hex digest of a file's contents, read in chunks.
+    """
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunksize), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fileStamp(filename):
+    """
+    Returns a cheap (size, mtime) stamp so callers can skip hashing unchanged files.
+    """
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime_ns]
@@ -0,0 +1,127 @@
+# %% Import libraries
+import json
+
+import geopandas as gpd
+import numpy as np
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+
+from helper_geometry import polygonal
+from helper_schema import loadBoundary, readTable
+from helper_store import cachedFrame
+
+"""
+Residents within reach of every outlet.
+- Outlets are buffered at each radius in SVY21 (EPSG:3414), Singapore's metric grid,
+  so a 1 km buffer really is 1 km across the whole island.
+- The subzones sit in an STRtree. Each outlet queries it once with its largest buffer,
+  and every radius then only intersects those few candidates.
+- A subzone contributes its population times the share of its area inside the buffer,
+  i.e. residents are assumed to be spread evenly within a subzone.
+- Results are cached on disk against the hash of the outlet and boundary files.
+"""
+
+# %% Constants
+RADII = (500, 1000, 2000)
+METRIC_CRS = 3414
+# Outlets in the same building share one lookup
+COORD_DECIMALS = 6
+
+# %% Classes
+
+
+class CatchmentIndex:
+    """
+    Build once with CatchmentIndex(subzones) and call population(lats, lngs, radii).
+    """
+
+    def __init__(self, gdf):
+        gdf = gdf.to_crs(epsg=METRIC_CRS).reset_index(drop=True)
+        self.geoms = [polygonal(geom) for geom in gdf.geometry]
+        self.prepared = [prep(geom) for geom in self.geoms]
+        self.pop = gdf["pop"].to_numpy(dtype=float)
+        # Population per square metre, so partial overlaps only need the overlap area
+        self.density = self.pop / np.array([geom.area for geom in self.geoms])
+        self.tree = STRtree(self.geoms)
+        # STRtree.query hands back the geometries themselves, map them to their row.
+        self.index = {id(geom): i for i, geom in enumerate(self.geoms)}
+
+    def _pointPopulation(self, point, radii):
+        buffers = [point.buffer(r) for r in radii]
+        candidates = [self.index[id(g)] for g in self.tree.query(buffers[-1])]
+        totals = np.zeros(len(radii))
+        for j, buf in enumerate(buffers):
+            prepared = prep(buf)
+            for i in candidates:
+                if not prepared.intersects(self.geoms[i]):
+                    continue
+                if prepared.contains(self.geoms[i]):
+                    totals[j] += self.pop[i]
+                elif self.prepared[i].contains(buf):
+                    totals[j] += self.density[i] * buf.area
+                else:
+                    totals[j] += self.density[i] * buf.intersection(self.geoms[i]).area
+        return totals
+
+    def population(self, lats, lngs, radii=RADII):
+        """
+        Returns an (n points, n radii) array of residents within each radius of each
+        point. Points without coordinates get NaN.
+        """
+        radii = sorted(radii)
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        out = np.full((len(lats), len(radii)), np.nan)
+        valid = ~(np.isnan(lats) | np.isnan(lngs))
+        coords = np.round(np.column_stack([lngs[valid], lats[valid]]), COORD_DECIMALS)
+        unique, inverse = np.unique(coords, axis=0, return_inverse=True)
+        points = gpd.GeoSeries(gpd.points_from_xy(unique[:, 0], unique[:, 1]), crs=4326)
+        points = points.to_crs(epsg=METRIC_CRS)
+        totals = np.array([self._pointPopulation(p, radii) for p in points])
+        out[valid] = totals.reshape(len(unique), len(radii))[inverse.ravel()]
+        return out
+
+
+# %% Functions
+
+
+def radiusColumn(radius):
+    return f"pop_{radius}m"
+
+
+def outletCatchments(outletfn, boundaryfn, radii=RADII):
+    """
+    Returns the outlets with one area weighted population column per radius.
+    """
+    df = readTable("outlets", outletfn)
+    index = CatchmentIndex(loadBoundary(boundaryfn, columns=["pop"]))
+    pops = index.population(df["lat"], df["lng"], radii)
+    for j, radius in enumerate(sorted(radii)):
+        df[radiusColumn(radius)] = pops[:, j].round()
+    return df
+
+
+def loadCatchments(
+    outletfn="./data/r2b_outletgeocode.csv",
+    boundaryfn="./data/r2_cleanboundary.geojson",
+    radii=RADII,
+):
+    """
+    outletCatchments cached on disk against its inputs and the radii asked for.
+    """
+    name = "catchments_" + "_".join(str(r) for r in sorted(radii))
+    inputs = [outletfn, boundaryfn, __file__]
+    build = lambda: outletCatchments(outletfn, boundaryfn, radii)
+    return cachedFrame(name, inputs, build)
+
+
+def main():
+    df = loadCatchments()
+    cols = [radiusColumn(r) for r in RADII]
+    print(df.groupby("brand", observed=True)[cols].median().round().to_string())
+    print(json.dumps({"outlets": len(df), "radii": list(RADII)}))
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,84 @@
 # %% Import
-import pandas as pd
+import argparse
+
 import numpy as np
 import geopandas as gpd
 import folium
 
+from helper_schema import loadBoundary, readTable
+from helper_zones import LEVEL_NAMES, ZOOM_LAYERS, dissolveZones, loadZones, zoneURL
+from helper_maplayers import (
+    LazyGeoJson,
+    OutletLayer,
+    StyleListener,
+    ZoomLevels,
+    classBreaks,
+    classify,
+    cssColor,
+    outletRows,
+)
+from helper_mapasset import buildMapAsset
+from helper_whitespace import loadWhitespace
+from helper_metrics import timed
+
+# Regions at the lowest zooms, see helper_zones.ZOOM_LAYERS
+MIN_ZOOM = 10
+# Zone layers first shown past this zoom are fetched from the app, not put in map.html
+ZOOM_START = 12
+# Served by app.py, which hands out the zone layers map.html fetches
+MAP_FILE = "map.html"
+# Same map with every zone level embedded, for opening without the app
+STANDALONE_FILE = "map_standalone.html"
+# Low density subzones are blanked out of the choropleth, see README.
+NAN_LIMIT = 2500
+# Most under-served subzones marked on the whitespace layer
+WHITESPACE_TOP = 25
+# Subzone properties shown in the choropleth tooltip and their labels
+TOOLTIP_FIELDS = {
+    "pln_area_n": "Planning Area",
+    "subzone_n": "Subzone Name",
+    "area_km2": "Area (km2)",
+    "pop": "Population",
+    "pop_density/km2": "Population Density (/km2)",
+}
+# Same for the dissolved planning area and region layers
+LEVEL_TOOLTIPS = {
+    "subzone_n": TOOLTIP_FIELDS,
+    "pln_area_n": {
+        "pln_area_n": "Planning Area",
+        "region_n": "Region",
+        "area_km2": "Area (km2)",
+        "pop": "Population",
+        "pop_density/km2": "Population Density (/km2)",
+    },
+    "region_n": {
+        "region_n": "Region",
+        "area_km2": "Area (km2)",
+        "pop": "Population",
+        "pop_density/km2": "Population Density (/km2)",
+    },
+}
+
 # %% Functions
-def cleanedGeoDF(filename, target_col):
-    gdf = gpd.read_file(filename)
-    nan_limit = 2500
-
-    # Hacky method of exploding the geometry collection in the gdf and dissolving it again
-    # to create MultiPolygons because GeoJSON tooltips doesn't play nice.
-    # See JURONG ISLAND AND BUKOM
-    gdf = gdf.explode()
-    gdf = gdf.dissolve(by="subzone_n", as_index=False)
-    s = gdf[target_col]
-    s.mask(s < nan_limit, np.nan, inplace=True)
-    gdf["area_km2"] = gdf["area_km2"].round(2)
+@timed("map_geodf")
+def cleanedGeoDF(filename, target_col, zoom=None, key="subzone_n"):
+    # Full resolution unless a simplified level for the map's zoom range is asked for.
+    # key picks the subzones or the planning areas / regions dissolved from them.
+    if zoom is not None:
+        gdf = loadZones(filename, key, zoom)
+    elif key == "subzone_n":
+        gdf = loadBoundary(filename)
+    else:
+        gdf = dissolveZones(loadBoundary(filename), key)
+    nan_limit = NAN_LIMIT
+
+    # Shapes arrive normalized by r2_cleanboundary (no GeometryCollections, see JURONG
+    # ISLAND AND BUKOM), so there is nothing to explode and dissolve here any more.
+    # Columns are replaced rather than masked in place, the store's arrays are read-only.
+    # Both as float64, float32 values would reach the tooltips as 0.10000000149
+    s = gdf[target_col].astype(float)
+    gdf[target_col] = s.mask(s < nan_limit, np.nan)
+    gdf["area_km2"] = gdf["area_km2"].astype(float).round(2)
     return gdf
 
 
@@ -24,111 +86,170 @@ def createBaseMap():
     startpoint = (1.3521, 103.8198)
     sg_map = folium.Map(
         location=startpoint,
-        zoom_start=12,
+        zoom_start=ZOOM_START,
         control_scale=True,
-        # prefer_canvas=True,
-        min_zoom=12,
+        # Outlets and subzones are drawn on one canvas instead of an SVG node each
+        prefer_canvas=True,
+        min_zoom=MIN_ZOOM,
     )
 
     return sg_map
 
 
-def createChoropleth(gdf, map_obj, target_col, fill_color, bins):
-
-    # Add a choropleth layer
-    choropleth_layer = folium.Choropleth(
-        geo_data=gdf,
-        data=gdf,
-        columns=["subzone_n", target_col],
-        key_on="feature.properties.subzone_n",
-        fill_color=fill_color,
-        line_weight=0.3,
-        name="Choropleth Layer",
-        fill_opacity=0.6,
-        nan_fill_color="black",
-        nan_fill_opacity=0.15,
-        bins=bins,
-        overlay=True,
-        control=False,
-        legend_name=f"Subzones of Planning Areas grouped by their {target_col}",
-        reset=True,
-    ).add_to(map_obj)
-
-    # Add tooltips to each subzone
-    style_function = lambda x: {
-        "fillColor": "white",
-        "fillOpacity": 0,
-        "weight": 0,
+def _choroplethLayer(gdf, target_col, fill_color, bins, key, url=None):
+    """
+    Returns one GeoJson layer of the zones of key and its legend. The layer carries both
+    the fill colour and the tooltip, so every polygon is written into map.html once.
+    Only the tooltip fields (and the target column) go along as properties.
+    With url, only the fill classes go into map.html and the polygons are fetched from
+    url when the layer is first shown.
+    """
+    edges, colors = classBreaks(gdf[target_col], fill_color, bins)
+    classes = dict(zip(gdf[key], classify(gdf[target_col], edges).tolist()))
+    tooltip_fields = LEVEL_TOOLTIPS[key]
+    label = TOOLTIP_FIELDS.get(target_col, target_col)
+    legend = {
+        "caption": f"{LEVEL_NAMES[key]} grouped by their {label}",
+        "edges": edges,
+        "colors": colors,
     }
+    if url is not None:
+        layer = LazyGeoJson(
+            url,
+            key,
+            classes,
+            colors,
+            tooltip_fields,
+            name=f"{LEVEL_NAMES[key]} Layer",
+        )
+        layer.add_child(StyleListener(key))
+        return layer, legend
+    fields = list(tooltip_fields)
+    if target_col not in fields:
+        fields.append(target_col)
+
+    # Fill by class, grey out the zones blanked by cleanedGeoDF
+    def style_function(feature):
+        k = classes.get(feature["properties"][key], -1)
+        if k < 0:
+            return {
+                "fillColor": "black",
+                "fillOpacity": 0.15,
+                "color": "black",
+                "weight": 0.3,
+            }
+        return {
+            "fillColor": colors[k],
+            "fillOpacity": 0.6,
+            "color": "black",
+            "weight": 0.3,
+        }
 
     highlight_function = lambda x: {
-        "fillColor": "black",
-        "fillOpacity": 0.2,
+        "fillOpacity": 0.85,
+        "weight": 1,
     }
 
-    folium.GeoJson(
-        gdf,
+    layer = folium.GeoJson(
+        gdf[fields + ["geometry"]],
+        name=f"{LEVEL_NAMES[key]} Layer",
+        overlay=True,
+        control=False,
+        # Added and removed by ZoomLevels
+        show=False,
         tooltip=folium.GeoJsonTooltip(
-            fields=[
-                "pln_area_n",
-                "subzone_n",
-                "area_km2",
-                "pop",
-                "pop_density/km2",
-            ],
-            aliases=[
-                "Planning Area",
-                "Subzone Name",
-                "Area (km2)",
-                "Population",
-                "Population Density (/km2)",
-            ],
+            fields=list(tooltip_fields),
+            aliases=list(tooltip_fields.values()),
             localize=True,
             style="background-color: rgba(255,255,255,0.75);",
         ),
         style_function=style_function,
         highlight_function=highlight_function,
-    ).add_to(choropleth_layer)
+    )
+    # The dashboard restyles this layer in place when the metric or scheme changes
+    layer.add_child(StyleListener(key))
+    return layer, legend
+
+
+@timed("map_choropleth")
+def createZoomChoropleth(layers, map_obj, target_col, fill_color, bins, urls=None):
+    """
+    One choropleth layer per zone level, only the one matching the zoom is shown.
+    layers is a list of (gdf, key, min_zoom, max_zoom), see helper_zones.ZOOM_LAYERS.
+    Each level gets its own bins, region and subzone figures are far apart.
+    urls maps the keys of levels to fetch on demand to their GeoJSON url.
+    """
+    urls = urls or {}
+    levels = []
+    for gdf, key, min_zoom, max_zoom in layers:
+        layer, legend = _choroplethLayer(
+            gdf, target_col, fill_color, bins, key, url=urls.get(key)
+        )
+        layer.add_to(map_obj)
+        levels.append((layer, key, min_zoom, max_zoom, legend))
+    ZoomLevels(levels).add_to(map_obj)
+    return map_obj
+
+
+def createChoropleth(gdf, map_obj, target_col, fill_color, bins, key="subzone_n"):
+    """
+    Single level choropleth, shown at every zoom.
+    """
+    return createZoomChoropleth(
+        [(gdf, key, None, None)], map_obj, target_col, fill_color, bins
+    )
+
+
+@timed("map_whitespace")
+def createWhitespaceLayer(map_obj, boundary_path, outletdf_path, top=WHITESPACE_TOP):
+    """
+    Marks the subzones with the highest population x distance to the nearest outlet,
+    sized by their score. Hidden until switched on in the layer control.
+    """
+    df = loadWhitespace(boundary_path, outletdf_path, brands=[]).head(top)
+    layer = folium.FeatureGroup(name="Under-served Subzones", overlay=True, show=False)
+    max_score = max(df["score"].max(), 1)
+    for row in df.itertuples():
+        tooltip = (
+            f"<b>Subzone:</b> {row.subzone_n} <br><b>Population:</b> {row.pop:,.0f}"
+            f" <br><b>Nearest outlet:</b> {row.dist_m / 1000:.1f} km"
+        )
+        folium.CircleMarker(
+            location=(row.lat, row.lng),
+            radius=6 + 14 * row.score / max_score,
+            tooltip=tooltip,
+            color="#5B396B",
+            weight=1,
+            fill=True,
+            fill_opacity=0.5,
+        ).add_to(layer)
+    layer.add_to(map_obj)
     return map_obj
 
 
+@timed("map_outlets")
 def loopcreatePoints(map_obj, outletdf_path):
-    outletdf = pd.read_csv(outletdf_path)
+    outletdf = readTable("outlets", outletdf_path)
+    # Split once instead of masking the whole df again for every brand
+    by_brand = dict(tuple(outletdf.groupby("brand", observed=True)))
 
-    def _createPoints(brand, color, df, map_obj, show):
+    def _createPoints(brand, color, map_obj, show):
         """
-        Taking the arg brand, create a new df of only that brand.
-        - Create a new layer
-        - Add all the coordinates of the outlets belonging to that brand and plot points
+        Taking the arg brand, take the df of only that brand.
+        - Create a new layer holding all its outlets as one payload
+        - The markers are drawn in the browser on the map's canvas
         - Push it to the specified map object.
         """
-        new_df = df[df["brand"] == brand]
-
-        brand_layer = folium.FeatureGroup(
-            name=f"{brand} Layer", overlay=True, control=True, show=show
-        )
-        for brand, address, lat, lng in zip(
-            new_df["brand"], new_df["address"], new_df["lat"], new_df["lng"]
-        ):
-            folium.CircleMarker(
-                location=(lat, lng),
-                radius=10,
-                tooltip=f"<b>Brand:</b> {brand} <br><b>Address:</b> {address}",
-                color=color,
-                weight=1,
-                fill=color,
-                fill_opacity=1,
-            ).add_to(brand_layer)
-
-            folium.Marker(
-                location=(lat + 0.00001, lng + 0.00001),
-                tooltip=f"<b>Brand:</b> {brand} <br><b>Address:</b> {address}",
-                icon=folium.DivIcon(
-                    html=f"""<div style="font-weight: 700;color: white">{brand[0]}</div>"""
-                ),
-            ).add_to(brand_layer)
-
-        brand_layer.add_to(map_obj)
+        new_df = by_brand.get(brand, outletdf.iloc[0:0])
+        OutletLayer(
+            brand=brand,
+            color=cssColor(color),
+            rows=outletRows(new_df),
+            name=f"{brand} Layer",
+            overlay=True,
+            control=True,
+            show=show,
+        ).add_to(map_obj)
 
     brands = {
         "Koufu": "red",
@@ -153,41 +274,87 @@ def loopcreatePoints(map_obj, outletdf_path):
             "HappyHawkers",
             "Gourmet",
         ]:
-            _createPoints(
-                brand=brand, color=color, df=outletdf, map_obj=map_obj, show=True
-            )
+            _createPoints(brand=brand, color=color, map_obj=map_obj, show=True)
         else:
-            _createPoints(
-                brand=brand, color=color, df=outletdf, map_obj=map_obj, show=False
-            )
+            _createPoints(brand=brand, color=color, map_obj=map_obj, show=False)
     return map_obj
 
 
-def displayAndSave(map_obj, save_map):
+@timed("map_save")
+def displayAndSave(map_obj, save_map, filename=MAP_FILE):
     folium.LayerControl().add_to(map_obj)
     if save_map == True:
-        map_obj.save("map.html")
-    display(map_obj)
+        map_obj.save(filename)
+        if filename == MAP_FILE:
+            # Hashed and precompressed copy that app.py serves to the iframe
+            buildMapAsset(filename)
+    try:
+        display(map_obj)
+    except NameError:
+        # display only exists inside Jupyter / the interactive window.
+        pass
 
 
-def main():
+def inNotebook():
+    try:
+        display
+    except NameError:
+        return False
+    return True
+
+
+def zoomLayers(filename, target_col, lazy=True):
+    """
+    Returns the createZoomChoropleth layers of helper_zones.ZOOM_LAYERS and the urls of
+    those first shown past ZOOM_START, which the app serves through registerZoneRoutes.
+    lazy=False embeds every level and returns no urls, for maps shown without the app.
+    """
+    layers, urls = [], {}
+    for key, lo, hi, zoom in ZOOM_LAYERS:
+        layers.append((cleanedGeoDF(filename, target_col, zoom=zoom, key=key), key, lo, hi))
+        if lazy and lo is not None and lo > ZOOM_START:
+            urls[key] = zoneURL(key, zoom)
+    return layers, urls
+
+
+def main(standalone=None):
+    """
+    Builds map.html for app.py. standalone embeds the subzones instead of fetching them
+    from the app and saves to STANDALONE_FILE, the default inside Jupyter where there is
+    no app to fetch from.
+    """
+    if standalone is None:
+        standalone = inNotebook()
     # I can change this value to make changes to what kind of choropleth to be presented
     target_col = "pop_density/km2"
 
-    # Creates the geodataframe
-    gdf = cleanedGeoDF("./data/r2_cleanboundary.geojson", target_col)
+    filename = "./data/r2_cleanboundary.geojson"
     # Create the base map object
     sg_map = createBaseMap()
-    # Add choropleth layer
-    sg_map = createChoropleth(gdf, sg_map, target_col, "Reds", bins=5)
+    # Add choropleth layer: regions, planning areas or subzones depending on the zoom,
+    # the subzones are only fetched once zoomed in to them
+    layers, urls = zoomLayers(filename, target_col, lazy=not standalone)
+    sg_map = createZoomChoropleth(layers, sg_map, target_col, "Reds", bins=5, urls=urls)
     # Add the outlet points
     sg_map = loopcreatePoints(sg_map, "./data/r2b_outletgeocode.csv")
+    # Add the subzones furthest from any outlet
+    sg_map = createWhitespaceLayer(
+        sg_map, "./data/r2_cleanboundary.geojson", "./data/r2b_outletgeocode.csv"
+    )
 
     # This should be the last function
-    displayAndSave(sg_map, save_map=True)
+    displayAndSave(
+        sg_map, save_map=True, filename=STANDALONE_FILE if standalone else MAP_FILE
+    )
 
 
 # %% Main Execute
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Builds the dashboard map.")
+    parser.add_argument(
+        "--standalone",
+        action="store_true",
+        help=f"embed every zone level and write {STANDALONE_FILE} instead",
+    )
+    main(standalone=parser.parse_args().standalone)
 # %%
@@ -1,50 +1,38 @@
 # %% Import libraries
-import pandas as pd
-import numpy as np
-import geopandas as gpd
-
-# %% Functions
-def createOutletPivot(filename):
-    df = pd.read_csv(filename)
-    # Group by all the brands according to their planning areas.
-    groupdf = df.groupby(
-        by=["pln_area_n", "brand"], as_index=False, dropna=False
-    ).count()
-    # Pivot it around for readability
-    pivotdf = (
-        groupdf.pivot(index="pln_area_n", columns="brand", values="postalcode")
-        .reset_index()
-        .fillna(0)
-    )
-    return pivotdf
+from helper_schema import readTable
+from helper_store import cachedFrame
+from helper_metrics import timed
 
+# Written by data/r3_zonehierarchy.py, one row per planning area
+PLANNING_AREA_FILE = "./data/r3_planningareas.csv"
+BRAND_PREFIX = "outlets_"
+# Sum of population x km to the nearest outlet over the planning area's subzones
+WHITESPACE_COL = "Whitespace Score"
 
+# %% Functions
+@timed("table_planning_area")
 def createPlanningArea(filename):
-    gdf = gpd.read_file(filename)
-    pagdf = gdf.dissolve(by="pln_area_n", aggfunc="sum")
-    pagdf["pop_density/km2"] = (round(pagdf["pop"] / pagdf["area_km2"], 0)).astype(int)
-    pagdf = pagdf.reset_index().drop(columns="geometry")
-    pagdf = pd.DataFrame(pagdf)
-    return pagdf
-
-
-def mergeDF(pivotdf, pagdf):
-    mdf = pd.merge(pagdf, pivotdf, how="outer", on="pln_area_n").fillna(0)
-    mdf.iloc[:, 4:] = mdf.iloc[:, 4:].astype(int)
-    mdf["area_km2"] = mdf["area_km2"].apply(lambda x: round(x, 2))
-    return mdf
-
-
+    # Already summed up by the pipeline, only the columns need arranging
+    df = readTable("planning_areas", filename)
+    brand_cols = [c for c in df.columns if c.startswith(BRAND_PREFIX)]
+    cols = ["pln_area_n", "area_km2", "pop", "pop_density/km2"]
+    padf = df[cols + brand_cols + ["whitespace"]].copy()
+    padf.columns = cols + [c[len(BRAND_PREFIX) :] for c in brand_cols] + ["whitespace"]
+    # Back to float64 before rounding, float32 would show as 0.10000000149 in the table
+    padf["area_km2"] = padf["area_km2"].astype(float).round(2)
+    return padf
+
+
+@timed("table_build")
 def main():
-    pivotdf = createOutletPivot("./data/r2b_outletgeocode.csv")
-    padf = createPlanningArea("./data/r2_cleanboundary.geojson")
-    mdf = mergeDF(pivotdf, padf)
+    mdf = createPlanningArea(PLANNING_AREA_FILE)
     mdf.rename(
         columns={
             "pln_area_n": "Planning Area",
             "area_km2": "Area (km2)",
             "pop": "Population",
             "pop_density/km2": "Population Density (/km2)",
+            "whitespace": WHITESPACE_COL,
         },
         inplace=True,
     )
@@ -52,8 +40,15 @@ def main():
     return mdf
 
 
+def loadTable():
+    """
+    main() cached on disk against its inputs, so restarts and extra workers skip the csv.
+    """
+    return cachedFrame("summary_table", [PLANNING_AREA_FILE, __file__], main)
+
+
 # %% Main execute
 if __name__ == "__main__":
     main()
 
-# %%
\ No newline at end of file
+# %%
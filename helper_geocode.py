@@ -0,0 +1,220 @@
+# %% Import libraries
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from geopy import GoogleV3
+from geopy.exc import GeocoderQuotaExceeded, GeocoderTimedOut, GeocoderUnavailable
+
+from helper_cache import cachePath
+
+"""
+Cached, concurrent geocoding for the outlet pipeline.
+- Results are kept in a sqlite file keyed by the normalized postal code and address,
+  including lookups that found nothing, each with its own time-to-live.
+- Cache misses go through a small thread pool behind a token bucket, with retries on
+  timeouts and rate limiting. A lookup that still fails is reported and left uncached,
+  the rest of the batch carries on.
+- The backend only needs a geocode(query) method returning (address, (lat, lng)) or None,
+  so GoogleBackend can be pointed at a local stub service for testing.
+"""
+
+# %% Constants
+TTL_FOUND = 180 * 24 * 3600
+TTL_NOT_FOUND = 7 * 24 * 3600
+# GoogleV3 reports rate limiting (OVER_QUERY_LIMIT) as GeocoderQuotaExceeded
+RETRYABLE = (GeocoderTimedOut, GeocoderUnavailable, GeocoderQuotaExceeded)
+
+# %% Functions
+
+
+def normalizeKey(postalcode, address):
+    """
+    Returns the cache key for an outlet, e.g. "239693|8 grange road #b1-01".
+    """
+    mo = re.search(r"\d{6}", str(postalcode))
+    postal = mo.group() if mo else ""
+    address = re.sub(r"\s+", " ", str(address).replace("\xa0", " ")).strip().lower()
+    return f"{postal}|{address}"
+
+
+def normalizeKeys(postalcodes, addresses):
+    """
+    normalizeKey over whole columns with vectorized string ops, returns a Series.
+    """
+    postal = pd.Series(postalcodes).astype(str).str.extract(r"(\d{6})", expand=False)
+    address = (
+        pd.Series(addresses, index=postal.index)
+        .astype(str)
+        .str.replace("\xa0", " ", regex=False)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+        .str.lower()
+    )
+    return postal.fillna("") + "|" + address
+
+
+# %% Classes
+
+
+class GoogleBackend:
+    """
+    One GoogleV3 client reused for every lookup. domain and scheme can point it elsewhere,
+    e.g. GoogleBackend("test", domain="127.0.0.1:8000", scheme="http") for a stub service.
+    """
+
+    def __init__(self, api_key, domain="maps.googleapis.com", scheme="https", timeout=10):
+        self.client = GoogleV3(api_key=api_key, domain=domain, scheme=scheme, timeout=timeout)
+
+    def geocode(self, query):
+        result = self.client.geocode(query, region="sg")
+        if result is None:
+            return None
+        return (result[0], result[1])
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeocodeCache:
+    """
+    sqlite backed cache. Only used from the thread that owns it.
+    """
+
+    def __init__(self, filename=None):
+        self.conn = sqlite3.connect(filename or cachePath("geocode.sqlite"))
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS geocode (
+                key TEXT PRIMARY KEY,
+                address TEXT,
+                lat REAL,
+                lng REAL,
+                found INTEGER NOT NULL,
+                fetched REAL NOT NULL
+            )
+            """
+        )
+
+    def get(self, key, now=None):
+        """
+        Returns (hit, result). result is None for a cached negative lookup.
+        """
+        row = self.conn.execute(
+            "SELECT address, lat, lng, found, fetched FROM geocode WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return False, None
+        address, lat, lng, found, fetched = row
+        ttl = TTL_FOUND if found else TTL_NOT_FOUND
+        if (now or time.time()) - fetched > ttl:
+            return False, None
+        return True, ((address, (lat, lng)) if found else None)
+
+    def put(self, key, result):
+        if result is None:
+            values = (key, None, None, None, 0, time.time())
+        else:
+            values = (key, result[0], result[1][0], result[1][1], 1, time.time())
+        self.conn.execute("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)", values)
+        self.conn.commit()
+
+
+# %% Batch lookups
+
+
+def geocodeOutlet(backend, postalcode, address):
+    """
+    Search the postal code first, then the address if that fails.
+    """
+    result = backend.geocode(str(postalcode).split()[-1])
+    if result is None:
+        result = backend.geocode(address)
+    return result
+
+
+def _withRetries(func, bucket, retries, backoff):
+    def _call(*args):
+        for attempt in range(retries + 1):
+            bucket.acquire()
+            try:
+                return func(*args)
+            except RETRYABLE:
+                if attempt == retries:
+                    raise
+                time.sleep(backoff * 2 ** attempt)
+
+    return _call
+
+
+def batchGeocode(
+    postalcodes, addresses, backend, cache=None, workers=4, rate=10, retries=3, backoff=1
+):
+    """
+    Returns a list of (address, (lat, lng)) or None, one per outlet.
+    Only outlets missing from the cache (or expired) are sent to the backend. Outlets whose
+    lookup raised (after the retries) get None too and are tried again on the next run.
+    """
+    cache = cache or GeocodeCache()
+    keys = [normalizeKey(p, a) for p, a in zip(postalcodes, addresses)]
+
+    results, misses = {}, {}
+    for key, postalcode, address in zip(keys, postalcodes, addresses):
+        if key in results or key in misses:
+            continue
+        hit, result = cache.get(key)
+        if hit:
+            results[key] = result
+        else:
+            misses[key] = (postalcode, address)
+
+    lookup = _withRetries(
+        lambda p, a: geocodeOutlet(backend, p, a), TokenBucket(rate), retries, backoff
+    )
+    failed = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(lookup, *args): key for key, args in misses.items()}
+        # Cached as they finish, so a failure doesn't lose the lookups already paid for
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                failed[key] = e
+                results[key] = None
+                continue
+            cache.put(key, results[key])
+
+    not_found = sum(results[k] is None for k in misses) - len(failed)
+    print(
+        f"Geocoded {len(keys)} outlets: {len(keys) - len(misses)} from cache, "
+        f"{len(misses)} looked up ({not_found} not found, {len(failed)} failed)."
+    )
+    for key, e in sorted(failed.items()):
+        print(f"Geocoding failed for {key}: {e!r}")
+    return [results[key] for key in keys]
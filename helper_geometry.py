@@ -0,0 +1,64 @@
+# %% Import libraries
+from shapely import wkb
+from shapely.geometry import MultiPolygon
+
+"""
+Small geometry utilities shared by the map, catchment and lookup helpers.
+"""
+
+# %% Functions
+
+
+def polygonal(geom):
+    """
+    Returns geom with only its polygons if it is a GeometryCollection, otherwise unchanged.
+    Clipping and the raw boundary file both produce collections mixing in stray lines and
+    points, which GeoJSON tooltips and GEOS predicates don't handle.
+    """
+    if geom is None or geom.geom_type != "GeometryCollection":
+        return geom
+    polys = []
+    for g in geom.geoms:
+        if g.geom_type == "Polygon":
+            polys.append(g)
+        elif g.geom_type == "MultiPolygon":
+            polys.extend(g.geoms)
+    return MultiPolygon(polys)
+
+
+def normalize(geom):
+    """
+    Returns geom repaired and reduced to its polygons, in 2D.
+    - Invalid shapes (self intersections, bow ties) are repaired with buffer(0).
+    - GeometryCollections become MultiPolygons through polygonal.
+    - The z value of every vertex is dropped.
+    """
+    if geom is None or geom.is_empty:
+        return geom
+    if geom.has_z:
+        geom = wkb.loads(wkb.dumps(geom, output_dimension=2))
+    if not geom.is_valid:
+        geom = polygonal(geom.buffer(0))
+    return polygonal(geom)
+
+
+def validityStats(before, after):
+    """
+    Returns counts of what normalize changed between two lists of geometries.
+    """
+    stats = {
+        "rows": len(before),
+        "invalid": 0,
+        "collections": 0,
+        "empty": 0,
+        "changed_area_m2": 0.0,
+    }
+    for old, new in zip(before, after):
+        if old is None or old.is_empty:
+            stats["empty"] += 1
+            continue
+        stats["invalid"] += int(not old.is_valid)
+        stats["collections"] += int(old.geom_type == "GeometryCollection")
+        stats["changed_area_m2"] += abs(new.area - old.area)
+    stats["changed_area_m2"] = round(stats["changed_area_m2"], 1)
+    return stats
@@ -0,0 +1,109 @@
+# %% Import libraries
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+from shapely import vectorized
+
+from helper_geometry import polygonal
+from helper_schema import loadBoundary
+
+"""
+Point-in-polygon lookup of subzone, planning area and region for lat-lng coordinates.
+The subzones are reprojected to lat-lng and their envelopes kept in one array once.
+A batch of points is located subzone by subzone: the points inside each envelope are
+picked out with NumPy and tested against the polygon in one shapely.vectorized call, so
+the Python loop runs over the few subzones near the points, not over the points.
+"""
+
+# %% Constants
+ZONE_COLS = ["subzone_n", "pln_area_n", "region_n"]
+
+# %% Classes
+
+
+class SubzoneLocator:
+    """
+    Build once with SubzoneLocator(gdf) or getLocator(filename), then call
+    locate(lats, lngs) for any number of points.
+    """
+
+    def __init__(self, gdf):
+        gdf = gdf.to_crs(epsg=4326).reset_index(drop=True)
+        self.geoms = [polygonal(geom) for geom in gdf.geometry]
+        self.zones = gdf[ZONE_COLS].to_numpy(dtype=object)
+        # minx, miny, maxx, maxy per subzone
+        self.boxes = np.array([geom.bounds for geom in self.geoms], dtype=float)
+
+    def locateIndex(self, lats, lngs):
+        """
+        Returns the row of the subzone holding each point, -1 where there is none.
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        idx = np.full(len(lats), -1, dtype=np.int64)
+        valid = ~(np.isnan(lats) | np.isnan(lngs))
+        if not valid.any():
+            return idx
+        # Only subzones whose envelope overlaps the points' envelope are looked at
+        x, y, b = lngs[valid], lats[valid], self.boxes
+        near = np.flatnonzero(
+            (b[:, 0] <= x.max())
+            & (b[:, 2] >= x.min())
+            & (b[:, 1] <= y.max())
+            & (b[:, 3] >= y.min())
+        )
+        for i in near:
+            inside = (
+                (idx < 0)
+                & (lngs >= b[i, 0])
+                & (lngs <= b[i, 2])
+                & (lats >= b[i, 1])
+                & (lats <= b[i, 3])
+            )
+            rows = np.flatnonzero(inside)
+            if len(rows):
+                hit = vectorized.contains(self.geoms[i], lngs[rows], lats[rows])
+                idx[rows[hit]] = i
+        return idx
+
+    def locate(self, lats, lngs):
+        """
+        Returns a df of subzone_n, pln_area_n and region_n, one row per point.
+        Points outside every subzone get None.
+        """
+        idx = self.locateIndex(lats, lngs)
+        zones = np.full((len(idx), len(ZONE_COLS)), None, dtype=object)
+        found = idx >= 0
+        zones[found] = self.zones[idx[found]]
+        return pd.DataFrame(zones, columns=ZONE_COLS)
+
+
+# %% Functions
+
+
+@lru_cache(maxsize=None)
+def getLocator(filename="./data/r2_cleanboundary.geojson"):
+    """
+    One locator per boundary file per process.
+    """
+    return SubzoneLocator(loadBoundary(filename))
+
+
+def registerLocateRoute(server, filename="./data/r2_cleanboundary.geojson"):
+    """
+    Adds /api/locate?lat=<lat>&lng=<lng> to the Flask server.
+    """
+
+    @server.route("/api/locate")
+    def locateZone():
+        try:
+            lat = float(request.args["lat"])
+            lng = float(request.args["lng"])
+        except (KeyError, ValueError):
+            return jsonify({"error": "lat and lng are required numbers"}), 400
+        row = getLocator(filename).locate([lat], [lng]).iloc[0]
+        return jsonify(row.to_dict())
+
+    return server
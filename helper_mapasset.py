@@ -0,0 +1,117 @@
+# %% Import libraries
+import gzip
+import json
+import os
+
+from flask import Response, abort, request
+
+from helper_cache import cachePath, fileHash, fileStamp
+
+try:
+    import brotli
+except ImportError:
+    # gzip alone still works, brotli only shaves off a bit more.
+    brotli = None
+
+"""
+Serves map.html as a static, content addressed asset instead of inlining it into the layout.
+- At map build time the html is copied to map.<hash>.html with gzip and brotli variants.
+- The Flask route answers with the smallest variant the browser accepts, a strong ETag
+  and an immutable Cache-Control, so repeat visits only cost a 304 or nothing at all.
+"""
+
+# %% Constants
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+ENCODINGS = [("br", ".br"), ("gzip", ".gz"), ("identity", "")]
+
+# %% Functions
+
+
+def _manifestPath():
+    return cachePath("map", "manifest.json")
+
+
+def readManifest():
+    path = _manifestPath()
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def buildMapAsset(filename="map.html"):
+    """
+    Writes the hashed copy of filename and its compressed variants. Returns the manifest.
+    """
+    with open(filename, "rb") as f:
+        body = f.read()
+    digest = fileHash(filename)[:16]
+    name = f"map.{digest}.html"
+
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(body, quality=11)
+    for encoding, suffix in ENCODINGS:
+        if encoding in variants:
+            with open(cachePath("map", name + suffix), "wb") as f:
+                f.write(variants[encoding])
+
+    manifest = {
+        "name": name,
+        "digest": digest,
+        "stamp": fileStamp(filename),
+        "bytes": {k: len(v) for k, v in variants.items()},
+    }
+    with open(_manifestPath(), "w") as f:
+        json.dump(manifest, f)
+    print(f"{name} built, " + ", ".join(f"{k}: {v} bytes" for k, v in manifest["bytes"].items()))
+    return manifest
+
+
+def ensureMapAsset(filename="map.html"):
+    """
+    Returns the manifest, rebuilding the asset first if filename changed since the last build.
+    """
+    manifest = readManifest()
+    if manifest is not None and manifest["stamp"] == fileStamp(filename):
+        if os.path.isfile(cachePath("map", manifest["name"])):
+            return manifest
+    return buildMapAsset(filename)
+
+
+def pickEncoding(accept_encoding, available):
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.split(",")}
+    for encoding, suffix in ENCODINGS:
+        if encoding == "identity" or encoding in accepted:
+            if encoding in available:
+                return encoding, suffix
+    return "identity", ""
+
+
+def registerMapRoute(server, filename="map.html"):
+    """
+    Adds the /map/<name> route to the Flask server and returns the url of the current map.
+    """
+    manifest = ensureMapAsset(filename)
+    bodies = {}
+
+    @server.route("/map/<name>")
+    def mapAsset(name):
+        if name != manifest["name"]:
+            abort(404)
+        encoding, suffix = pickEncoding(
+            request.headers.get("Accept-Encoding", ""), manifest["bytes"]
+        )
+        etag = f'"{manifest["digest"]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=304, headers=headers)
+
+        if encoding not in bodies:
+            with open(cachePath("map", name + suffix), "rb") as f:
+                bodies[encoding] = f.read()
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(bodies[encoding], mimetype="text/html", headers=headers)
+
+    return f"/map/{manifest['name']}"
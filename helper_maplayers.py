@@ -0,0 +1,318 @@
+# %% Import libraries
+import numpy as np
+from branca.element import MacroElement
+from branca.utilities import color_brewer
+from folium.map import Layer
+from jinja2 import Template
+
+"""
+Custom folium layers for things the stock folium 0.12 classes can't express.
+"""
+
+# folium's marker icon palette has a few names that aren't CSS colours. Canvas silently
+# ignores an unknown fillStyle, so these get their hex values from folium's icon CSS.
+ICON_COLORS = {"lightred": "#FF8E7F", "darkpurple": "#5B396B"}
+# postMessage type the embedding page uses to restyle the choropleth, see helper_mapstyle.
+STYLE_MESSAGE = "koufu-style"
+
+# %% Functions
+
+
+def cssColor(color):
+    return ICON_COLORS.get(color, color)
+
+
+def outletRows(df):
+    """
+    Returns the [lat, lng, address] payload of an outlet layer.
+    """
+    return [
+        [round(float(lat), 6), round(float(lng), 6), address]
+        for lat, lng, address in zip(df["lat"], df["lng"], df["address"])
+    ]
+
+
+def classBreaks(values, fill_color, bins):
+    """
+    Returns the bin edges and colours the same way folium.Choropleth picks them.
+    NaN values are left out of the edges.
+    """
+    values = np.asarray(values, dtype=float)
+    edges = np.histogram(values[~np.isnan(values)], bins=bins)[1]
+    colors = color_brewer(fill_color, n=len(edges) - 1)
+    return [float(e) for e in edges], colors
+
+
+def classify(values, edges):
+    """
+    Returns the bin of each value, right edge inclusive for the last bin only, like
+    branca's StepColormap. NaN values get -1.
+    """
+    values = np.asarray(values, dtype=float)
+    classes = np.searchsorted(edges, values, side="right") - 1
+    classes = np.clip(classes, 0, len(edges) - 2)
+    classes[np.isnan(values)] = -1
+    return classes
+
+
+# %% Layers
+
+
+class OutletLayer(Layer):
+    """
+    All outlets of one brand as a single compact payload of [lat, lng, address] rows.
+    The markers, their initials and their tooltips are created in the browser and drawn
+    on the map's canvas renderer, instead of two folium objects (and DOM nodes) per outlet.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            if (!window.KoufuInitialMarker) {
+                // Circle marker that also paints the brand's initial on the canvas.
+                window.KoufuInitialMarker = L.CircleMarker.extend({
+                    _updatePath: function () {
+                        L.CircleMarker.prototype._updatePath.call(this);
+                        var ctx = this._renderer._ctx;
+                        if (!ctx || this._empty()) { return; }
+                        ctx.save();
+                        ctx.font = "bold 11px sans-serif";
+                        ctx.fillStyle = "white";
+                        ctx.textAlign = "center";
+                        ctx.textBaseline = "middle";
+                        ctx.fillText(this.options.initial, this._point.x, this._point.y);
+                        ctx.restore();
+                    }
+                });
+            }
+            var {{ this.get_name() }} = L.featureGroup();
+            (function (group) {
+                var brand = {{ this.brand|tojson }};
+                var rows = {{ this.rows|tojson }};
+                var style = {
+                    radius: 10,
+                    color: {{ this.color|tojson }},
+                    weight: 1,
+                    fill: true,
+                    fillColor: {{ this.color|tojson }},
+                    fillOpacity: 1,
+                    initial: brand[0]
+                };
+                rows.forEach(function (row) {
+                    new window.KoufuInitialMarker([row[0], row[1]], style)
+                        .bindTooltip(function () {
+                            return "<b>Brand:</b> " + brand + " <br><b>Address:</b> " + row[2];
+                        })
+                        .addTo(group);
+                });
+            })({{ this.get_name() }});
+            {%- if this.show %}
+            {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+            {%- endif %}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self, brand, color, rows, name=None, overlay=True, control=True, show=True
+    ):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "OutletLayer"
+        self.brand = brand
+        self.color = color
+        self.rows = rows
+
+
+class LazyGeoJson(Layer):
+    """
+    GeoJSON layer whose features are fetched from url the first time it is added to the
+    map, so a layer only shown when zoomed in adds nothing to map.html but its styling.
+    Features are filled by class like StyleListener does: classes maps each feature's key
+    property to a bin of colors, -1 for zones blanked out of the choropleth. The tooltip
+    lists fields under their aliases.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function () {
+                var key = {{ this.key|tojson }};
+                var classes = {{ this.classes|tojson }};
+                var colors = {{ this.colors|tojson }};
+                var fields = {{ this.fields|tojson }};
+                var aliases = {{ this.aliases|tojson }};
+                var layer = L.geoJson(null, {
+                    style: function (feature) {
+                        var k = classes[feature.properties[key]];
+                        if (k === undefined || k < 0) {
+                            return {fillColor: "black", fillOpacity: 0.15, color: "black", weight: 0.3};
+                        }
+                        return {fillColor: colors[k], fillOpacity: 0.6, color: "black", weight: 0.3};
+                    },
+                    onEachFeature: function (feature, shape) {
+                        shape.bindTooltip(function () {
+                            return fields.map(function (field, i) {
+                                var v = feature.properties[field];
+                                return "<b>" + aliases[i] + ":</b> " +
+                                    (typeof v === "number" ? v.toLocaleString() : v);
+                            }).join("<br>");
+                        }, {sticky: true});
+                        shape.on({
+                            mouseover: function (e) { e.target.setStyle({fillOpacity: 0.85, weight: 1}); },
+                            mouseout: function (e) { layer.resetStyle(e.target); }
+                        });
+                    }
+                });
+                // addData styles new features with options.style, which StyleListener
+                // keeps current, so a restyle before the fetch still applies.
+                layer.once("add", function () {
+                    fetch({{ this.url|tojson }})
+                        .then(function (response) { return response.json(); })
+                        .then(function (data) { layer.addData(data); });
+                });
+                return layer;
+            })();
+            {%- if this.show %}
+            {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+            {%- endif %}
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        url,
+        key,
+        classes,
+        colors,
+        fields,
+        name=None,
+        overlay=True,
+        control=False,
+        show=False,
+    ):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = "LazyGeoJson"
+        self.url = url
+        self.key = key
+        self.classes = classes
+        self.colors = colors
+        # {property: label}, in tooltip order
+        self.fields = list(fields)
+        self.aliases = list(fields.values())
+
+
+class StyleListener(MacroElement):
+    """
+    Lets the page embedding map.html restyle its parent GeoJson layer.
+    Listens for postMessage payloads built by helper_mapstyle.styleJSON, recolours every
+    feature by the class of its key property and hands the new legend to ZoomLevels.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            (function (layer) {
+                var key = {{ this.key|tojson }};
+                window.addEventListener("message", function (e) {
+                    var d = e.data;
+                    if (e.origin !== window.location.origin || !d || d.type !== {{ this.message_type|tojson }}) {
+                        return;
+                    }
+                    var level = d.levels[key];
+                    if (!level) { return; }
+                    var style = function (feature) {
+                        var k = level.classes[feature.properties[key]];
+                        if (k === undefined || k < 0) {
+                            return {fillColor: "black", fillOpacity: 0.15, color: "black", weight: 0.3};
+                        }
+                        return {fillColor: level.colors[k], fillOpacity: 0.6, color: "black", weight: 0.3};
+                    };
+                    // resetStyle on mouseout falls back to options.style, keep it in step.
+                    layer.options.style = style;
+                    layer.setStyle(style);
+                    if (window.KoufuLevels) {
+                        window.KoufuLevels.setLegend(
+                            key, {caption: level.caption, edges: level.edges, colors: level.colors}
+                        );
+                    }
+                });
+            })({{ this._parent.get_name() }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, key="subzone_n", message_type=STYLE_MESSAGE):
+        super().__init__()
+        self._name = "StyleListener"
+        self.key = key
+        self.message_type = message_type
+
+
+class ZoomLevels(MacroElement):
+    """
+    Shows one choropleth layer at a time depending on the zoom, e.g. regions when zoomed
+    out and subzones when zoomed in, with a legend that follows the visible layer.
+    levels is a list of (layer, key, min_zoom, max_zoom, legend) tuples, where legend is
+    a {caption, edges, colors} dict and None leaves a zoom bound open. Add it to the map
+    after the layers, which should be created with show=False.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            (function (map) {
+                var levels = [
+                {%- for layer, key, min_zoom, max_zoom, legend in this.levels %}
+                    {
+                        layer: {{ layer.get_name() }},
+                        key: {{ key|tojson }},
+                        min: {{ min_zoom|tojson }},
+                        max: {{ max_zoom|tojson }},
+                        legend: {{ legend|tojson }}
+                    },
+                {%- endfor %}
+                ];
+                var control = L.control({position: "topright"});
+                control.onAdd = function () {
+                    this._div = L.DomUtil.create("div", "koufu-legend");
+                    this._div.style.cssText =
+                        "background: rgba(255,255,255,0.85); padding: 6px 8px; font: 12px sans-serif;";
+                    return this._div;
+                };
+                control.addTo(map);
+                var fmt = function (v) { return v.toLocaleString(undefined, {maximumFractionDigits: 2}); };
+                var refresh = function () {
+                    var zoom = map.getZoom();
+                    levels.forEach(function (level) {
+                        var visible = (level.min === null || zoom >= level.min) &&
+                            (level.max === null || zoom <= level.max);
+                        if (visible && !map.hasLayer(level.layer)) { level.layer.addTo(map); }
+                        if (!visible && map.hasLayer(level.layer)) { map.removeLayer(level.layer); }
+                        if (!visible) { return; }
+                        var legend = level.legend;
+                        control._div.innerHTML = "<b>" + legend.caption + "</b>" + legend.colors.map(function (c, i) {
+                            return '<br><i style="display:inline-block;width:12px;height:12px;background:' + c +
+                                '"></i> ' + fmt(legend.edges[i]) + " &ndash; " + fmt(legend.edges[i + 1]);
+                        }).join("");
+                    });
+                };
+                window.KoufuLevels = {
+                    setLegend: function (key, legend) {
+                        levels.forEach(function (level) {
+                            if (level.key === key) { level.legend = legend; }
+                        });
+                        refresh();
+                    }
+                };
+                map.on("zoomend", refresh);
+                refresh();
+            })({{ this._parent.get_name() }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, levels):
+        super().__init__()
+        self._name = "ZoomLevels"
+        self.levels = levels
@@ -0,0 +1,79 @@
+# %% Import libraries
+import json
+from functools import lru_cache
+
+import numpy as np
+
+from helper_schema import loadBoundary, readTable
+from helper_maplayers import STYLE_MESSAGE, classBreaks, classify
+from helper_zones import LEVEL_NAMES, ZONE_KEYS
+from helper_drawmap import NAN_LIMIT
+
+"""
+Choropleth restyling for the live map.
+The polygons are only ever sent once, inside map.html. Switching the metric or colour
+scheme sends a small JSON payload instead: for each zone level (subzones, planning areas,
+regions) the bin edges, their colours and the class of every zone keyed by its name.
+Payloads are serialized once per (metric, scheme) and kept in a bounded LRU cache, so
+with gunicorn --preload the default is built in the master and every worker shares it.
+"""
+
+# %% Constants
+BOUNDARY_FILE = "./data/r2_cleanboundary.geojson"
+# helper_schema datasets of the dissolved levels, written by data/r3_zonehierarchy.py
+LEVEL_DATASETS = {
+    "pln_area_n": "planning_areas",
+    "region_n": "regions",
+}
+# Metric column and the label shown in the dropdown and the legend
+METRICS = {
+    "pop_density/km2": "Population Density (/km2)",
+    "pop": "Population",
+    "area_km2": "Area (km2)",
+}
+SCHEMES = ["Reds", "YlOrRd", "Blues", "Greens", "Purples"]
+DEFAULT_METRIC = "pop_density/km2"
+DEFAULT_SCHEME = "Reds"
+BINS = 5
+
+# %% Functions
+
+
+@lru_cache(maxsize=None)
+def _levelValues(key, filename):
+    """
+    Attribute columns of one zone level, without decoding any geometry.
+    """
+    if key == "subzone_n":
+        df = loadBoundary(filename, columns=[key, *METRICS], geometry=False)
+    else:
+        df = readTable(LEVEL_DATASETS[key], columns=[key, *METRICS])
+    return df.drop_duplicates(key).reset_index(drop=True)
+
+
+@lru_cache(maxsize=len(METRICS) * len(SCHEMES))
+def styleJSON(metric, scheme, bins=BINS, filename=BOUNDARY_FILE):
+    """
+    Returns the serialized restyle payload of one metric and colour scheme.
+    Zones blanked out of the map (density below NAN_LIMIT) get class -1.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}")
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown colour scheme {scheme!r}")
+    levels = {}
+    for key in ZONE_KEYS:
+        df = _levelValues(key, filename)
+        values = np.array(df[metric], dtype=float)  # a copy, store columns are read-only
+        values[df["pop_density/km2"].to_numpy(dtype=float) < NAN_LIMIT] = np.nan
+        edges, colors = classBreaks(values, scheme, bins)
+        levels[key] = {
+            "caption": f"{LEVEL_NAMES[key]} grouped by their {METRICS[metric]}",
+            "edges": edges,
+            "colors": colors,
+            "classes": dict(zip(df[key], classify(values, edges).tolist())),
+        }
+    return json.dumps(
+        {"type": STYLE_MESSAGE, "metric": metric, "levels": levels},
+        separators=(",", ":"),
+    )
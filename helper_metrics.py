@@ -0,0 +1,212 @@
+# %% Import libraries
+import bisect
+import functools
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+"""
+Request and build stage metrics in the Prometheus text format, without extra dependencies.
+- registerMetrics(server) times every Flask request (Dash layout, callbacks, the map
+  asset, zone layers) and records the response size, labelled by route and, for Dash
+  callbacks, by the callback's output.
+- @timed("stage") and stageTimer("stage") time the map and table builders.
+- /metrics serves the histograms plus this worker's memory. Each gunicorn worker keeps
+  its own counters and reports its pid, so sum across pids when aggregating.
+- Setting SLOW_REQUEST_MS logs every request slower than that to the koufu.slow logger.
+"""
+
+# %% Constants
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1 << 10, 1 << 12, 1 << 14, 1 << 16, 1 << 18, 1 << 20, 1 << 22, 1 << 24)
+SLOW_ENV = "SLOW_REQUEST_MS"
+METRICS_ROUTE = "/metrics"
+
+slow_log = logging.getLogger("koufu.slow")
+
+# %% Classes
+
+
+class Histogram:
+    """
+    Cumulative histogram per label set, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self.lock:
+            # Per bucket counts (not yet cumulative), then the sum and total count
+            series = self.series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, **const_labels):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = [(k, list(c), s, n) for k, (c, s, n) in sorted(self.series.items())]
+        for key, counts, total, count in items:
+            pairs = list(zip(self.label_names, key)) + sorted(const_labels.items())
+            labels = ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs)
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(
+                    f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+# %% Metrics
+REQUEST_SECONDS = Histogram(
+    "koufu_request_seconds",
+    "Time spent handling a request.",
+    ["route", "callback", "method", "status"],
+    LATENCY_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    "koufu_response_bytes",
+    "Size of the response body as sent, after any precompression.",
+    ["route", "callback"],
+    BYTES_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "koufu_stage_seconds",
+    "Time spent in a map or table build stage.",
+    ["stage"],
+    LATENCY_BUCKETS,
+)
+
+# %% Functions
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def residentBytes():
+    """
+    Current resident set size of this process, peak RSS where /proc isn't available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def stageTimer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage):
+    """
+    Decorator recording each call of the function under stage.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stageTimer(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def renderMetrics():
+    lines = []
+    pid = os.getpid()
+    for metric in (REQUEST_SECONDS, RESPONSE_BYTES, STAGE_SECONDS):
+        lines.extend(metric.render(pid=pid))
+    lines += [
+        "# HELP koufu_process_resident_memory_bytes Resident memory of this worker.",
+        "# TYPE koufu_process_resident_memory_bytes gauge",
+        f'koufu_process_resident_memory_bytes{{pid="{pid}"}} {residentBytes()}',
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _callbackLabel():
+    """
+    The output a Dash callback request is for, empty for every other request.
+    """
+    if not request.path.endswith("_dash-update-component"):
+        return ""
+    body = request.get_json(silent=True) or {}
+    return str(body.get("output", ""))
+
+
+def registerMetrics(server, slow_ms=None):
+    """
+    Adds request timing hooks and the /metrics route to the Flask server.
+    slow_ms defaults to the SLOW_REQUEST_MS environment variable, unset disables the log.
+    """
+    if slow_ms is None and os.environ.get(SLOW_ENV):
+        slow_ms = float(os.environ[SLOW_ENV])
+
+    @server.before_request
+    def startTimer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def recordRequest(response):
+        start = g.pop("metrics_start", None)
+        if start is None or request.path == METRICS_ROUTE:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        callback = _callbackLabel()
+        REQUEST_SECONDS.observe(
+            elapsed,
+            route=route,
+            callback=callback,
+            method=request.method,
+            status=response.status_code,
+        )
+        size = response.content_length
+        if size is None and not response.direct_passthrough:
+            size = len(response.get_data())
+        if size is not None:
+            RESPONSE_BYTES.observe(size, route=route, callback=callback)
+        if slow_ms is not None and elapsed * 1000 >= slow_ms:
+            slow_log.warning(
+                "%s %s %s took %.0f ms, %s bytes",
+                request.method,
+                request.full_path.rstrip("?"),
+                callback,
+                elapsed * 1000,
+                size,
+            )
+        return response
+
+    @server.route(METRICS_ROUTE)
+    def metrics():
+        return Response(renderMetrics(), mimetype="text/plain; version=0.0.4")
+
+    return server
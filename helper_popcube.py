@@ -0,0 +1,231 @@
+# %% Import libraries
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from helper_cache import ROOT_DIR, cachePath, fileStamp
+from helper_store import readFrame
+
+"""
+The SingStat resident population as one dense NumPy array.
+- Axes are subzone, year, age band, sex and dwelling type, in that order.
+- Built once from the year partitions of r_demographicsdata and kept under data/cache,
+  rebuilt when the partitions are rewritten.
+- Queries pick labels on each axis and sum the rest away, optionally grouped by
+  planning area through a membership matrix, instead of a groupby over the long table.
+
+    cube = loadCube()
+    cube.sum(year=2018, age=(20, 34), by="planning_area")
+"""
+
+# %% Constants
+DEMOGRAPHICS_DIR = os.path.join(ROOT_DIR, "data", "r_demographicsdata")
+AXES = ("subzone", "year", "age", "sex", "dwelling")
+# Source column behind each axis
+SOURCE_COLUMNS = {
+    "subzone": "SZ",
+    "year": "Time",
+    "age": "AG",
+    "sex": "Sex",
+    "dwelling": "TOD",
+}
+CUBE_VERSION = 1
+AGE_PATT = re.compile(r"^(?P<lo>\d+)(?:_to_(?P<hi>\d+)|_and_over)$")
+
+# %% Functions
+
+
+def cubePath():
+    return cachePath("popcube")
+
+
+def ageBounds(band):
+    """
+    Returns the (lowest, highest) age of a band label such as "20_to_24" or "90_and_over".
+    """
+    mo = AGE_PATT.match(band)
+    if not mo:
+        raise ValueError(f"Can't parse age band {band!r}")
+    lo = int(mo.group("lo"))
+    hi = int(mo.group("hi")) if mo.group("hi") else np.iinfo(np.int16).max
+    return lo, hi
+
+
+def readPartitions(folder=DEMOGRAPHICS_DIR):
+    """
+    Returns every year partition listed in the manifest as one long df.
+    """
+    with open(os.path.join(folder, "manifest.json")) as f:
+        years = json.load(f)["years"]
+    dfs = [readFrame(os.path.join(folder, f"year={y}")) for y in years]
+    return pd.concat(dfs, ignore_index=True)
+
+
+def buildCube(df):
+    """
+    Returns (data, labels, planning_area) from the long format demographics df.
+    planning_area holds the planning area of every subzone, in subzone order.
+    """
+    df = df.assign(
+        SZ=df["SZ"].astype(str).str.upper(), PA=df["PA"].astype(str).str.upper()
+    )
+    labels = {}
+    codes = []
+    for axis in AXES:
+        col = df[SOURCE_COLUMNS[axis]]
+        col = col.astype(int) if axis == "year" else col.astype(str)
+        values = pd.unique(col)
+        if axis == "age":
+            values = sorted(values, key=ageBounds)
+        else:
+            values = sorted(values)
+        labels[axis] = [v.item() if hasattr(v, "item") else v for v in values]
+        codes.append(pd.Categorical(col, labels[axis]).codes)
+
+    shape = tuple(len(labels[axis]) for axis in AXES)
+    flat = np.ravel_multi_index(codes, shape)
+    size = int(np.prod(shape))
+    data = np.bincount(flat, weights=df["Pop"].to_numpy(), minlength=size)
+    data = data.round().astype(np.int32).reshape(shape)
+
+    pa = df.drop_duplicates("SZ").set_index("SZ")["PA"]
+    return data, labels, pa.reindex(labels["subzone"]).tolist()
+
+
+def writeCube(data, labels, planning_area, folder, extra_meta=None):
+    """
+    Writes the cube next to its final location and swaps it in, like helper_store.writeFrame.
+    """
+    tmp = f"{folder}.tmp-{os.getpid()}"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    np.save(os.path.join(tmp, "cube.npy"), data)
+    meta = {"version": CUBE_VERSION, "labels": labels, "planning_area": planning_area}
+    meta.update(extra_meta or {})
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    if os.path.isdir(folder):
+        shutil.rmtree(folder, ignore_errors=True)
+    try:
+        os.rename(tmp, folder)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _readCubeMeta(folder):
+    path = os.path.join(folder, "meta.json")
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def loadCube(source=DEMOGRAPHICS_DIR, mmap_mode="r"):
+    """
+    Returns the PopulationCube of the demographics store, building it if it is stale.
+    """
+    folder = cubePath()
+    stamp = fileStamp(os.path.join(source, "manifest.json"))
+    meta = _readCubeMeta(folder)
+    if meta is None or meta.get("version") != CUBE_VERSION or meta.get("stamp") != stamp:
+        data, labels, planning_area = buildCube(readPartitions(source))
+        writeCube(data, labels, planning_area, folder, extra_meta={"stamp": stamp})
+        print(f"Built the population cube {data.shape} into {folder}.")
+        meta = _readCubeMeta(folder)
+    data = np.load(os.path.join(folder, "cube.npy"), mmap_mode=mmap_mode)
+    return PopulationCube(data, meta["labels"], meta["planning_area"])
+
+
+# %% Classes
+
+
+class PopulationCube:
+    """
+    Population counts over AXES with label based selection.
+    Each selection argument takes None (everything), one label or a list of labels.
+    age also takes an (lowest, highest) tuple of ages and picks the bands inside it.
+    """
+
+    def __init__(self, data, labels, planning_area):
+        self.data = data
+        self.labels = {axis: list(labels[axis]) for axis in AXES}
+        self.positions = {
+            axis: {label: i for i, label in enumerate(self.labels[axis])}
+            for axis in AXES
+        }
+        self.labels["planning_area"] = sorted(set(planning_area))
+        # membership[p, s] is 1 when subzone s lies in planning area p
+        pa_pos = {pa: i for i, pa in enumerate(self.labels["planning_area"])}
+        rows = [pa_pos[pa] for pa in planning_area]
+        self.membership = np.zeros((len(pa_pos), len(planning_area)), dtype=np.int64)
+        self.membership[rows, np.arange(len(planning_area))] = 1
+        self.ages = np.array([ageBounds(band) for band in self.labels["age"]])
+
+    def index(self, axis, selection):
+        """
+        Returns the positions along axis picked by selection.
+        """
+        if selection is None:
+            return np.arange(len(self.labels[axis]))
+        if axis == "age" and isinstance(selection, tuple):
+            lo, hi = selection
+            return np.flatnonzero((self.ages[:, 0] >= lo) & (self.ages[:, 1] <= hi))
+        if isinstance(selection, (str, int, np.integer)):
+            selection = [selection]
+        try:
+            pos = [self.positions[axis][label] for label in selection]
+            return np.array(pos, dtype=np.intp)
+        except KeyError as e:
+            raise KeyError(f"{e.args[0]!r} is not a label of the {axis} axis") from None
+
+    def select(self, **selection):
+        """
+        Returns the sub-array of the selected labels, with all five axes kept.
+        """
+        unknown = set(selection) - set(AXES)
+        if unknown:
+            raise TypeError(f"Unknown axes {sorted(unknown)}")
+        idx = [self.index(axis, selection.get(axis)) for axis in AXES]
+        return self.data[np.ix_(*idx)]
+
+    def sum(self, by=None, **selection):
+        """
+        Returns the total population of a selection.
+        - by=None gives one number.
+        - by=<axis> or by="planning_area" gives a Series over that axis' selected labels.
+        """
+        block = self.select(**selection)
+        if by is None:
+            return int(block.sum())
+        if by == "planning_area":
+            subzones = self.index("subzone", selection.get("subzone"))
+            totals = self.membership[:, subzones] @ block.sum(axis=(1, 2, 3, 4))
+            return pd.Series(totals, index=self.labels["planning_area"], name="pop")
+        axis = AXES.index(by)
+        others = tuple(i for i in range(len(AXES)) if i != axis)
+        labels = [self.labels[by][i] for i in self.index(by, selection.get(by))]
+        return pd.Series(block.sum(axis=others), index=labels, name="pop")
+
+
+def main():
+    cube = loadCube()
+    print(
+        json.dumps(
+            {
+                "shape": dict(zip(AXES, cube.data.shape)),
+                "bytes": int(cube.data.nbytes),
+                "years": cube.labels["year"],
+            }
+        )
+    )
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
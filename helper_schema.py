@@ -0,0 +1,258 @@
+# %% Import libraries
+import numpy as np
+import pandas as pd
+
+from helper_store import loadGeoFile
+
+"""
+Typed loaders for the outlet and zone datasets, the one place their dtypes are decided.
+- Brands and zone names are categoricals, counts and populations the narrowest integer
+  that holds them and areas float32. Coordinates stay float64, float32 only resolves
+  about a metre at Singapore's longitude.
+- Every load checks the dataset's invariants and raises SchemaError on the first one
+  broken, so a bad crawl or boundary file stops the pipeline where it comes in.
+- castFrame() applies the same to frames built in memory before they are written.
+- Run as a script to report each dataset's memory as typed here and as read by default.
+"""
+
+# %% Constants
+CATEGORY = "category"
+# Singapore with some margin, outlets geocoded outside it are wrong
+LAT_RANGE = (1.1, 1.5)
+LNG_RANGE = (103.5, 104.1)
+POSTAL_PATT = r"Singapore \d{6}"
+# Outlet count columns of the r3 tables, see data/r3_zonehierarchy.py
+BRAND_PREFIX = "outlets_"
+
+ZONE_DTYPES = {
+    "subzone_n": CATEGORY,
+    "pln_area_n": CATEGORY,
+    "region_n": CATEGORY,
+    "area_km2": "float32",
+    "pop": "int32",
+    "pop_density/km2": "int32",
+}
+OUTLET_DTYPES = {
+    "brand": CATEGORY,
+    "lat": "float64",
+    "lng": "float64",
+}
+
+# Per dataset: the file it is read from (relative to the project root), column dtypes,
+# dtypes of columns matched by prefix, and the checks run on every load.
+# Columns not listed are left as read.
+DATASETS = {
+    "outlets_raw": {
+        "file": "./data/r_outletsdata.csv",
+        "dtypes": {"brand": CATEGORY},
+        "checks": ["brand"],
+    },
+    "outlets_geocoded": {
+        "file": "./data/r2_outletgeocode.csv",
+        "dtypes": OUTLET_DTYPES,
+        "checks": ["brand", "postalcode", "coords"],
+    },
+    "outlets": {
+        "file": "./data/r2b_outletgeocode.csv",
+        "dtypes": {**OUTLET_DTYPES, **ZONE_DTYPES},
+        "checks": ["brand", "postalcode", "coords", "zones"],
+    },
+    "boundary": {
+        "file": "./data/r2_cleanboundary.geojson",
+        "dtypes": ZONE_DTYPES,
+        "checks": ["subzone_n", "zones", "totals"],
+    },
+    "subzones": {
+        "file": "./data/r3_zonehierarchy.csv",
+        "dtypes": {**ZONE_DTYPES, "whitespace": "int32"},
+        "prefixes": {BRAND_PREFIX: "int16"},
+        "checks": ["subzone_n", "zones", "totals"],
+    },
+    "planning_areas": {
+        "file": "./data/r3_planningareas.csv",
+        "dtypes": {**ZONE_DTYPES, "whitespace": "int32"},
+        "prefixes": {BRAND_PREFIX: "int16"},
+        "checks": ["pln_area_n", "zones", "totals"],
+    },
+    "regions": {
+        "file": "./data/r3_regions.csv",
+        "dtypes": {**ZONE_DTYPES, "whitespace": "int32"},
+        "prefixes": {BRAND_PREFIX: "int16"},
+        "checks": ["region_n", "totals"],
+    },
+}
+
+# %% Classes
+
+
+class SchemaError(ValueError):
+    """
+    A dataset that doesn't hold what its schema says.
+    """
+
+
+# %% Functions
+
+
+def _fail(name, message):
+    raise SchemaError(f"{name}: {message}")
+
+
+def columnDtypes(name, columns):
+    """
+    Returns {column: dtype} for the columns of dataset name that the schema types.
+    """
+    spec = DATASETS[name]
+    dtypes = {c: spec["dtypes"][c] for c in columns if c in spec["dtypes"]}
+    for prefix, dtype in spec.get("prefixes", {}).items():
+        dtypes.update({c: dtype for c in columns if c.startswith(prefix)})
+    return dtypes
+
+
+def _castColumn(name, s, dtype):
+    if dtype == CATEGORY:
+        return s.astype(CATEGORY)
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        if s.isna().any():
+            _fail(name, f"{s.name} has missing values")
+        info = np.iinfo(dtype)
+        if len(s) and (s.min() < info.min or s.max() > info.max):
+            _fail(name, f"{s.name} doesn't fit in {dtype}")
+        if not np.array_equal(s.to_numpy(), np.round(s.to_numpy())):
+            _fail(name, f"{s.name} holds fractions")
+    return s.astype(dtype, copy=False)
+
+
+def validate(df, name):
+    """
+    Runs the checks of dataset name on df, raising SchemaError on the first failure.
+    """
+    checks = DATASETS[name]["checks"]
+    if "brand" in checks and df["brand"].isna().any():
+        _fail(name, "outlets without a brand")
+    if "postalcode" in checks:
+        ok = df["postalcode"].astype(str).str.fullmatch(POSTAL_PATT)
+        if not ok.all():
+            _fail(name, f"malformed postal codes {df.loc[~ok, 'postalcode'].tolist()}")
+    if "coords" in checks:
+        # Outlets not found by the geocoder have no coords, r2a_outletgeocode flags them
+        lat, lng = df["lat"], df["lng"]
+        if not (lat.isna() == lng.isna()).all():
+            _fail(name, "outlets with only one of lat and lng")
+        inside = lat.between(*LAT_RANGE) & lng.between(*LNG_RANGE)
+        outside = ~inside & lat.notna()
+        if outside.any():
+            rows = df.index[outside].tolist()
+            _fail(name, f"outlets outside Singapore at rows {rows}")
+    for key in ("subzone_n", "pln_area_n", "region_n"):
+        if key in checks:
+            if df[key].isna().any():
+                _fail(name, f"rows without a {key}")
+            dupes = df[key].duplicated()
+            if dupes.any():
+                _fail(name, f"duplicated {key} {df.loc[dupes, key].tolist()}")
+    if "zones" in checks:
+        keys = [k for k in ("subzone_n", "pln_area_n", "region_n") if k in df.columns]
+        placed = df[keys].notna()
+        # An outlet is either in a subzone (and so in all three) or in none
+        if not placed.eq(placed.iloc[:, 0], axis=0).all().all():
+            _fail(name, "zones that are only partly filled in")
+        for child, parent in zip(keys, keys[1:]):
+            parents = df.dropna(subset=[child]).groupby(child, observed=True)[parent]
+            if (parents.nunique() > 1).any():
+                _fail(name, f"a {child} that sits in more than one {parent}")
+    if "totals" in checks:
+        if (df["pop"] < 0).any():
+            _fail(name, "negative population")
+        if (df["area_km2"] <= 0).any():
+            _fail(name, "zones without area")
+    return df
+
+
+def castFrame(df, name):
+    """
+    Returns df with the dtypes of dataset name, after checking its invariants.
+    """
+    dtypes = columnDtypes(name, df.columns)
+    df = df.copy()
+    for col, dtype in dtypes.items():
+        df[col] = _castColumn(name, df[col], dtype)
+    return validate(df, name)
+
+
+def readTable(name, filename=None, columns=None):
+    """
+    Reads one of the csv datasets typed and checked.
+    filename overrides the default path, for scripts run from data/.
+    """
+    filename = filename or DATASETS[name]["file"]
+    header = pd.read_csv(filename, nrows=0).columns
+    # Categories parse straight from the file, numbers are narrowed after the checks
+    dtypes = {
+        c: dtype
+        for c, dtype in columnDtypes(name, header).items()
+        if dtype == CATEGORY or not np.issubdtype(np.dtype(dtype), np.integer)
+    }
+    df = pd.read_csv(filename, dtype=dtypes)
+    df = castFrame(df, name)
+    return df if columns is None else df[columns]
+
+
+def loadBoundary(filename=None, columns=None, geometry=True):
+    """
+    loadGeoFile with the boundary's columns typed and checked.
+    """
+    filename = filename or DATASETS["boundary"]["file"]
+    gdf = loadGeoFile(filename, geometry=geometry)
+    gdf = castFrame(gdf, "boundary")
+    if columns is None:
+        return gdf
+    keep = list(columns) + ([gdf.geometry.name] if geometry else [])
+    return gdf[keep]
+
+
+def frameBytes(df):
+    """
+    Deep memory of a DataFrame's attribute columns, geometry left out.
+    """
+    cols = [c for c in df.columns if c != getattr(df, "_geometry_column_name", None)]
+    return int(df[cols].memory_usage(index=False, deep=True).sum())
+
+
+def memoryReport(names=None):
+    """
+    Returns each dataset's memory typed here against read with default dtypes.
+    Datasets whose file isn't built yet are left out.
+    """
+    rows = []
+    for name in names or DATASETS:
+        filename = DATASETS[name]["file"]
+        try:
+            if name == "boundary":
+                plain = loadGeoFile(filename, geometry=False)
+                typed = loadBoundary(filename, geometry=False)
+            else:
+                plain = pd.read_csv(filename)
+                typed = readTable(name, filename)
+        except FileNotFoundError:
+            continue
+        default, compact = frameBytes(plain), frameBytes(typed)
+        rows.append(
+            {
+                "dataset": name,
+                "rows": len(typed),
+                "default_bytes": default,
+                "typed_bytes": compact,
+                "saved_%": round((1 - compact / default) * 100, 1) if default else 0.0,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def main():
+    print(memoryReport().to_string(index=False))
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
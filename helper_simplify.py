@@ -0,0 +1,159 @@
+# %% Import libraries
+import math
+import os
+
+import numpy as np
+import pandas as pd
+from shapely.ops import transform
+
+from helper_cache import cachePath
+from helper_schema import loadBoundary
+from helper_store import (
+    STORE_VERSION,
+    isFresh,
+    readFrame,
+    readMeta,
+    storePath,
+    writeFrame,
+)
+
+"""
+Multi-resolution versions of the subzone boundaries for the choropleth.
+- Simplify in metres (EPSG:6933) with a tolerance tied to the size of a pixel at a zoom level.
+- Reproject to lat-lng and round the coordinates to the precision that level can show.
+- Each level is written to its own store and rebuilt when the cleaned boundary file changes.
+"""
+
+# %% Constants
+# Web mercator ground resolution at zoom 0. Singapore sits close enough to the equator
+# that the latitude correction can be ignored.
+METRES_PER_PIXEL_Z0 = 156543.03392
+METRES_PER_DEGREE = 111320
+LEVEL_ZOOMS = (10, 12, 14, 16)
+# Users zoom in past the map's min_zoom, keep the outlines sharp a couple of levels further.
+ZOOM_HEADROOM = 2
+
+# %% Functions
+
+
+def toleranceForZoom(zoom, pixels=0.5):
+    """
+    Returns the simplification tolerance in metres for a zoom level.
+    """
+    return METRES_PER_PIXEL_Z0 / 2 ** zoom * pixels
+
+
+def decimalsForTolerance(tolerance):
+    """
+    Returns how many decimal places of a degree are still meaningful at a tolerance in metres.
+    """
+    return max(0, math.ceil(-math.log10(tolerance / METRES_PER_DEGREE)))
+
+
+def countVertices(geom):
+    if geom is None or geom.is_empty:
+        return 0
+    if hasattr(geom, "geoms"):
+        return sum(countVertices(g) for g in geom.geoms)
+    if hasattr(geom, "exterior"):
+        return len(geom.exterior.coords) + sum(len(r.coords) for r in geom.interiors)
+    return len(geom.coords)
+
+
+def quantize(gdf, decimals):
+    """
+    Reprojects to lat-lng and rounds every coordinate, dropping the z value on the way.
+    """
+    gdf = gdf.to_crs(epsg=4326)
+    _round = lambda x, y, z=None: (np.round(x, decimals), np.round(y, decimals))
+    gdf["geometry"] = gdf.geometry.apply(lambda geom: transform(_round, geom))
+    return gdf
+
+
+def simplifyLevel(gdf, zoom):
+    """
+    Returns a copy of gdf simplified and quantized for a zoom level.
+    preserve_topology keeps each polygon valid; shared edges between neighbouring
+    subzones are simplified independently, which is invisible below a pixel.
+    """
+    tolerance = toleranceForZoom(zoom)
+    level = gdf.copy()
+    level["geometry"] = level.geometry.simplify(tolerance, preserve_topology=True)
+    return quantize(level, decimalsForTolerance(tolerance))
+
+
+def levelPath(filename, zoom):
+    return cachePath(f"{os.path.basename(filename)}.z{zoom}.store")
+
+
+def levelFor(zoom):
+    """
+    Returns the coarsest built level that is at least as detailed as zoom needs.
+    """
+    for level in LEVEL_ZOOMS:
+        if level >= zoom:
+            return level
+    return LEVEL_ZOOMS[-1]
+
+
+def pickZoom(min_zoom):
+    """
+    Returns the coarsest built level that stays sharp for a map opened at min_zoom.
+    """
+    return levelFor(min_zoom + ZOOM_HEADROOM)
+
+
+def loadLevel(filename, zoom):
+    """
+    Returns the simplified boundaries for a zoom level, building the level if it is stale.
+    """
+    folder = levelPath(filename, zoom)
+    base = storePath(filename)
+    if isFresh(base, filename) and os.path.isfile(os.path.join(folder, "meta.json")):
+        meta = readMeta(folder)
+        if meta.get("sha256") == readMeta(base)["sha256"]:
+            if meta.get("version") == STORE_VERSION:
+                return readFrame(folder)
+    gdf = loadBoundary(filename)
+    level = simplifyLevel(gdf, zoom)
+    writeFrame(level, folder, extra_meta={"sha256": readMeta(base)["sha256"], "zoom": zoom})
+    return level
+
+
+def report(filename, zooms=LEVEL_ZOOMS):
+    """
+    Returns vertex counts and GeoJSON payload size of the full resolution file and each level.
+    """
+    gdf = loadBoundary(filename)
+    rows = [
+        {
+            "level": "full",
+            "tolerance_m": 0.0,
+            "vertices": int(gdf.geometry.apply(countVertices).sum()),
+            "bytes": os.path.getsize(filename),
+        }
+    ]
+    for zoom in zooms:
+        level = loadLevel(filename, zoom)
+        rows.append(
+            {
+                "level": f"z{zoom}",
+                "tolerance_m": round(toleranceForZoom(zoom), 2),
+                "vertices": int(level.geometry.apply(countVertices).sum()),
+                "bytes": len(level.to_json().encode("utf-8")),
+            }
+        )
+    df = pd.DataFrame(rows)
+    df["vertices_%"] = (df["vertices"] / df["vertices"].iloc[0] * 100).round(1)
+    df["bytes_%"] = (df["bytes"] / df["bytes"].iloc[0] * 100).round(1)
+    return df
+
+
+def main():
+    df = report("./data/r2_cleanboundary.geojson")
+    print(df.to_string(index=False))
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# %% Import libraries
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely import wkb
+
+from helper_cache import ROOT_DIR, cachePath, fileHash, fileStamp
+from helper_geometry import normalize
+
+"""
+Compiled columnar store for the processed datasets.
+- Each attribute column is written as its own .npy file so it can be memory-mapped.
+- Geometry is written as one flat buffer of 2D WKB plus an offsets array.
+- A store compiled from a source file carries that file's sha256 and is rebuilt when it changes.
+"""
+
+# The processed boundary, compiled by the boundary_store build stage before the stages
+# that read it run in parallel
+BOUNDARY_FILE = "./data/r2_cleanboundary.geojson"
+# Code that shapes every cachedFrame: the column encoding here and the dtypes helper_schema
+# casts to. Both are hashed into each cachedFrame key along with the caller's inputs.
+FRAME_CODE = [os.path.abspath(__file__), os.path.join(ROOT_DIR, "helper_schema.py")]
+# Level and zone stores are rebuilt too when this changes, their columns are typed by
+# helper_schema from version 3 on
+STORE_VERSION = 3
+
+# %% Functions
+
+
+def _writeColumn(folder, i, s):
+    """
+    Writes one column to disk and returns its entry for meta.json.
+    """
+    entry = {"name": s.name, "file": f"col_{i}.npy"}
+    if pd.api.types.is_categorical_dtype(s.dtype):
+        entry["kind"] = "cat"
+        entry["categories"] = [str(c) for c in s.cat.categories]
+        values = s.cat.codes.to_numpy()
+    elif pd.api.types.is_numeric_dtype(s.dtype) or pd.api.types.is_bool_dtype(s.dtype):
+        entry["kind"] = "num"
+        values = s.to_numpy()
+    else:
+        entry["kind"] = "str"
+        nulls = s.isna().to_numpy()
+        if nulls.any():
+            entry["nulls"] = f"col_{i}_nulls.npy"
+            np.save(os.path.join(folder, entry["nulls"]), nulls)
+        values = s.fillna("").astype(str).to_numpy().astype(str)
+    np.save(os.path.join(folder, entry["file"]), values)
+    return entry
+
+
+def _readColumn(folder, entry, mmap_mode):
+    values = np.load(os.path.join(folder, entry["file"]), mmap_mode=mmap_mode)
+    if entry["kind"] == "cat":
+        return pd.Categorical.from_codes(values, categories=entry["categories"])
+    if entry["kind"] == "str":
+        values = values.astype(object)
+        if "nulls" in entry:
+            values[np.load(os.path.join(folder, entry["nulls"]))] = None
+        return values
+    return values
+
+
+def writeFrame(df, folder, extra_meta=None):
+    """
+    Writes a DataFrame (or GeoDataFrame) to a store folder.
+    The folder is written next to its final location and swapped in at the end
+    so that readers never see a half-written store. The old folder is renamed aside
+    before the swap and only deleted after it, never while it is in place.
+    """
+    tmp = f"{folder}.tmp-{os.getpid()}"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    meta = {"version": STORE_VERSION, "rows": len(df), "columns": [], "geometry": None}
+    meta.update(extra_meta or {})
+
+    geom_col = df.geometry.name if isinstance(df, gpd.GeoDataFrame) else None
+    attrs = [c for c in df.columns if c != geom_col]
+    for i, col in enumerate(attrs):
+        meta["columns"].append(_writeColumn(tmp, i, df[col]))
+
+    if geom_col is not None:
+        # 2D only, the source files carry a meaningless 0.0 z value on every vertex.
+        blobs = [wkb.dumps(geom, output_dimension=2) for geom in df.geometry]
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in blobs])
+        buf = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+        np.save(os.path.join(tmp, "geometry_wkb.npy"), buf)
+        np.save(os.path.join(tmp, "geometry_offsets.npy"), offsets)
+        meta["geometry"] = {
+            "name": geom_col,
+            "crs": df.crs.to_string() if df.crs is not None else None,
+        }
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    old = f"{folder}.old-{os.getpid()}"
+    try:
+        os.rename(folder, old)
+    except OSError:
+        # Not there yet, or another process moved it aside first.
+        pass
+    try:
+        os.rename(tmp, folder)
+    except OSError:
+        # Another process swapped in the same store first, keep theirs.
+        shutil.rmtree(tmp, ignore_errors=True)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def readMeta(folder):
+    with open(os.path.join(folder, "meta.json")) as f:
+        return json.load(f)
+
+
+def readFrame(folder, columns=None, mmap_mode="r", geometry=True):
+    """
+    Returns the DataFrame (or GeoDataFrame) held in a store folder.
+    - columns limits which attribute columns are read.
+    - geometry=False skips decoding the shapes and returns a plain DataFrame.
+    """
+    meta = readMeta(folder)
+    data = {}
+    for entry in meta["columns"]:
+        if columns is None or entry["name"] in columns:
+            data[entry["name"]] = _readColumn(folder, entry, mmap_mode)
+    df = pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]))
+
+    geom = meta["geometry"]
+    if geom is None or not geometry:
+        return df
+    buf = np.load(os.path.join(folder, "geometry_wkb.npy"), mmap_mode=mmap_mode)
+    offsets = np.load(os.path.join(folder, "geometry_offsets.npy"))
+    geoms = [
+        wkb.loads(buf[start:end].tobytes()) for start, end in zip(offsets[:-1], offsets[1:])
+    ]
+    return gpd.GeoDataFrame(
+        df, geometry=gpd.GeoSeries(geoms, crs=geom["crs"]), crs=geom["crs"]
+    )
+
+
+def storePath(filename):
+    """
+    Returns the store folder compiled from a source file.
+    """
+    return cachePath(os.path.basename(filename) + ".store")
+
+
+def isFresh(folder, filename):
+    """
+    Checks if the store was compiled from the current contents of filename.
+    Unchanged size and mtime skip the hash, anything else falls back to comparing sha256.
+    """
+    if not os.path.isfile(os.path.join(folder, "meta.json")):
+        return False
+    meta = readMeta(folder)
+    if meta.get("version") != STORE_VERSION:
+        return False
+    if meta.get("stamp") == fileStamp(filename):
+        return True
+    return meta.get("sha256") == fileHash(filename)
+
+
+def compileGeoFile(filename):
+    """
+    Parses a GeoJSON once and writes it to its store, tagged with the source's sha256.
+    """
+    gdf = gpd.read_file(filename)
+    # r2_cleanboundary already normalizes, this only guards against older or foreign files
+    gdf["geometry"] = gpd.GeoSeries(
+        [normalize(geom) for geom in gdf.geometry], index=gdf.index, crs=gdf.crs
+    )
+    writeFrame(
+        gdf,
+        storePath(filename),
+        extra_meta={
+            "source": os.path.basename(filename),
+            "sha256": fileHash(filename),
+            "stamp": fileStamp(filename),
+        },
+    )
+    print(f"Compiled {filename} into {storePath(filename)}.")
+    return gdf
+
+
+def loadGeoFile(filename, columns=None, geometry=True):
+    """
+    Drop in replacement for gpd.read_file on the processed GeoJSON files.
+    Reads the compiled store if it is fresh, otherwise recompiles it first.
+    """
+    folder = storePath(filename)
+    if not isFresh(folder, filename):
+        compileGeoFile(filename)
+    return readFrame(folder, columns=columns, geometry=geometry)
+
+
+def cachedFrame(name, inputs, build):
+    """
+    Returns the DataFrame that build() produces, reusing the stored copy while none of the
+    input files (data and code alike) nor FRAME_CODE have changed.
+    Under gunicorn --preload the first call happens once in the master before forking.
+    """
+    files = FRAME_CODE + list(inputs)
+    key = hashlib.sha256("".join(fileHash(f) for f in files).encode()).hexdigest()
+    folder = cachePath(f"{name}.store")
+    if os.path.isfile(os.path.join(folder, "meta.json")):
+        if readMeta(folder).get("key") == key:
+            return readFrame(folder)
+    writeFrame(build(), folder, extra_meta={"key": key})
+    return readFrame(folder)
+
+
+def main():
+    if not isFresh(storePath(BOUNDARY_FILE), BOUNDARY_FILE):
+        compileGeoFile(BOUNDARY_FILE)
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
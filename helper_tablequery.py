@@ -0,0 +1,147 @@
+# %% Import libraries
+import re
+
+import numpy as np
+import pandas as pd
+
+"""
+Server side paging, sorting and filtering for the summary DataTable.
+- Every column's sort order is computed once up front with a stable argsort.
+- filter_query strings from the table are compiled into boolean masks, cached per query.
+- Each callback then only slices out and serializes one page.
+"""
+
+# %% Constants
+PART_PATT = re.compile(r"^\{(?P<col>[^}]+)\}\s+(?P<op>\S+)\s+(?P<val>.+)$")
+OPERATORS = {
+    "=": "eq",
+    "!=": "ne",
+    "<": "lt",
+    "<=": "le",
+    ">": "gt",
+    ">=": "ge",
+}
+COMPARISONS = set(OPERATORS.values())
+MAX_CACHED_FILTERS = 128
+
+# %% Functions
+
+
+def _parseValue(val):
+    val = val.strip()
+    if len(val) >= 2 and val[0] == val[-1] and val[0] in "\"'`":
+        return val[1:-1]
+    try:
+        return float(val)
+    except ValueError:
+        return val
+
+
+def parseFilter(filter_query):
+    """
+    Splits a DataTable filter_query into (column, operator, value, case_sensitive) parts.
+    Symbolic operators can carry the table's s/i case prefix, e.g. "s>" or "i=".
+    """
+    parts = []
+    for part in filter_query.split(" && "):
+        mo = PART_PATT.match(part.strip())
+        if not mo:
+            raise ValueError(f"Can't parse filter {part!r}")
+        op, sensitive = mo.group("op"), True
+        if op in ("icontains", "scontains"):
+            op, sensitive = "contains", op[0] == "s"
+        elif op[:1] in ("s", "i") and (op[1:] in OPERATORS or op[1:] in COMPARISONS):
+            op, sensitive = op[1:], op[0] == "s"
+        op = OPERATORS.get(op, op)
+        value = _parseValue(mo.group("val"))
+        parts.append((mo.group("col"), op, value, sensitive))
+    return parts
+
+
+# %% Classes
+
+
+class TableQuery:
+    """
+    Wraps the summary table. page() answers one DataTable callback.
+    """
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        self.orders = {
+            col: np.argsort(self.df[col].to_numpy(), kind="mergesort")
+            for col in self.df.columns
+        }
+        # Dense ranks (ties share a rank) for multi column sorts.
+        self.ranks = {
+            col: self.df[col].rank(method="dense", na_option="bottom").to_numpy()
+            for col in self.df.columns
+        }
+        self.masks = {}
+
+    def _partMask(self, col, op, value, sensitive):
+        s = self.df[col]
+        numeric = pd.api.types.is_numeric_dtype(s.dtype)
+        if op in COMPARISONS:
+            if numeric and not isinstance(value, float):
+                return np.zeros(len(s), dtype=bool)
+            if not numeric:
+                s, value = s.astype(str), str(value)
+                if not sensitive:
+                    s, value = s.str.lower(), value.lower()
+            return getattr(s, op)(value).to_numpy()
+        text = s.astype(str)
+        if isinstance(value, float) and value.is_integer():
+            # "contains 25" parses as 25.0, match on the digits that were typed.
+            value = int(value)
+        value = str(value)
+        if op == "contains":
+            return text.str.contains(value, case=sensitive, regex=False).to_numpy()
+        if op == "datestartswith":
+            return text.str.startswith(value).to_numpy()
+        raise ValueError(f"Unsupported filter operator {op!r}")
+
+    def filterMask(self, filter_query):
+        """
+        Returns the rows matching filter_query, None when there is no filter.
+        """
+        if not filter_query:
+            return None
+        if filter_query not in self.masks:
+            if len(self.masks) >= MAX_CACHED_FILTERS:
+                self.masks.clear()
+            mask = np.ones(len(self.df), dtype=bool)
+            for col, op, value, sensitive in parseFilter(filter_query):
+                if col in self.df.columns:
+                    mask &= self._partMask(col, op, value, sensitive)
+            self.masks[filter_query] = mask
+        return self.masks[filter_query]
+
+    def sortedIndex(self, sort_by):
+        """
+        Returns the row order for a DataTable sort_by list.
+        """
+        if not sort_by:
+            return np.arange(len(self.df))
+        if len(sort_by) == 1:
+            order = self.orders[sort_by[0]["column_id"]]
+            return order if sort_by[0]["direction"] == "asc" else order[::-1]
+        # Multi column sorts fall back to a lexsort over the cached ranks.
+        keys = []
+        for s in reversed(sort_by):
+            rank = self.ranks[s["column_id"]]
+            keys.append(rank if s["direction"] == "asc" else -rank)
+        return np.lexsort(keys)
+
+    def page(self, page_current, page_size, sort_by=None, filter_query=""):
+        """
+        Returns (records of the requested page, page_count).
+        """
+        idx = self.sortedIndex(sort_by)
+        mask = self.filterMask(filter_query)
+        if mask is not None:
+            idx = idx[mask[idx]]
+        page_count = max(1, -(-len(idx) // page_size))
+        start = page_current * page_size
+        records = self.df.iloc[idx[start : start + page_size]].to_dict("records")
+        return records, page_count
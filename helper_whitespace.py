@@ -0,0 +1,97 @@
+# %% Import libraries
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from helper_schema import loadBoundary, readTable
+
+"""
+Under-served subzones, scored by how many residents live how far from an outlet.
+- Outlets are projected to SVY21 (EPSG:3414) metres and indexed in one KD-tree per
+  brand plus one over every outlet.
+- Each subzone is represented by a point inside it (representative_point, which unlike
+  the centroid can't fall outside a concave subzone).
+- score = population x distance to the nearest outlet in km, computed for all subzones
+  in one vectorized pass.
+"""
+
+# %% Constants
+METRIC_CRS = 3414
+ZONE_COLS = ["subzone_n", "pln_area_n", "pop"]
+
+# %% Classes
+
+
+class OutletTrees:
+    """
+    KD-trees over the outlets of each brand and over all of them.
+    """
+
+    def __init__(self, df):
+        df = df.dropna(subset=["lat", "lng"])
+        points = gpd.GeoSeries(gpd.points_from_xy(df["lng"], df["lat"]), crs=4326)
+        points = points.to_crs(epsg=METRIC_CRS)
+        xy = np.column_stack([points.x.to_numpy(), points.y.to_numpy()])
+        self.overall = cKDTree(xy)
+        brands = df["brand"].to_numpy()
+        self.brands = {
+            brand: cKDTree(xy[brands == brand]) for brand in sorted(set(brands))
+        }
+
+    def nearest(self, xy, brand=None):
+        """
+        Returns the distance in metres from each point to the nearest outlet,
+        of one brand or of any brand.
+        """
+        tree = self.overall if brand is None else self.brands[brand]
+        dist, _ = tree.query(xy, k=1)
+        return dist
+
+
+# %% Functions
+
+
+def subzonePoints(gdf):
+    """
+    Returns a GeoSeries in SVY21 of one point inside each subzone.
+    """
+    return gdf.to_crs(epsg=METRIC_CRS).geometry.representative_point()
+
+
+def whitespaceScores(gdf, outletdf, brands=None):
+    """
+    Returns one row per subzone with the distance to the nearest outlet overall
+    (dist_m) and per brand (dist_<brand>_m), ranked by score, highest first.
+    """
+    trees = OutletTrees(outletdf)
+    points = subzonePoints(gdf)
+    xy = np.column_stack([points.x.to_numpy(), points.y.to_numpy()])
+    df = pd.DataFrame(gdf[ZONE_COLS]).reset_index(drop=True)
+    df["dist_m"] = trees.nearest(xy).round()
+    for brand in brands if brands is not None else trees.brands:
+        df[f"dist_{brand}_m"] = trees.nearest(xy, brand).round()
+    df["score"] = (df["pop"].to_numpy() * df["dist_m"].to_numpy() / 1000).round()
+    # Where the map puts the subzone's marker
+    latlng = points.to_crs(epsg=4326)
+    df["lat"], df["lng"] = latlng.y.to_numpy(), latlng.x.to_numpy()
+    return df.sort_values("score", ascending=False, ignore_index=True)
+
+
+def loadWhitespace(
+    boundaryfn="./data/r2_cleanboundary.geojson",
+    outletfn="./data/r2b_outletgeocode.csv",
+    brands=None,
+):
+    gdf = loadBoundary(boundaryfn, columns=ZONE_COLS)
+    return whitespaceScores(gdf, readTable("outlets", outletfn), brands)
+
+
+def main():
+    df = loadWhitespace(brands=[])
+    print(df[ZONE_COLS + ["dist_m", "score"]].head(20).to_string(index=False))
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()
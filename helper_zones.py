@@ -0,0 +1,188 @@
+# %% Import libraries
+import gzip
+import os
+from functools import lru_cache
+
+import geopandas as gpd
+import pandas as pd
+from flask import Response, abort, request
+from shapely.ops import unary_union
+
+from helper_cache import cachePath
+from helper_mapasset import pickEncoding
+from helper_geometry import normalize
+from helper_simplify import countVertices, loadLevel, simplifyLevel
+from helper_schema import loadBoundary
+from helper_store import (
+    STORE_VERSION,
+    isFresh,
+    readFrame,
+    readMeta,
+    storePath,
+    writeFrame,
+)
+
+"""
+Planning area and region boundaries dissolved from the subzones, for the zoomed out map.
+- Each layer carries the summed area and population and the density worked out again.
+- Layers are simplified for their own zoom range and cached like helper_simplify's
+  subzone levels, rebuilt when the cleaned boundary file changes.
+- registerZoneRoutes serves each layer as GeoJSON at /zones/<key>/z<zoom>.geojson, for
+  the map's layers that are only fetched once the user zooms in to them.
+"""
+
+# %% Constants
+ZONE_KEYS = ["subzone_n", "pln_area_n", "region_n"]
+# Layer key, shown from zoom, shown up to zoom (None for no limit), simplification level
+ZOOM_LAYERS = [
+    ("region_n", 10, 11, 12),
+    ("pln_area_n", 12, 13, 14),
+    ("subzone_n", 14, None, 14),
+]
+
+ZONE_URL = "/zones/{key}/z{zoom}.geojson"
+# Properties the served GeoJSON carries, for the tooltips. Fills come from map.html.
+ZONE_PROPERTIES = [
+    "subzone_n",
+    "pln_area_n",
+    "region_n",
+    "area_km2",
+    "pop",
+    "pop_density/km2",
+]
+CACHE_CONTROL = "public, max-age=86400"
+
+# Plural names used in layer names and legends
+LEVEL_NAMES = {
+    "subzone_n": "Subzones",
+    "pln_area_n": "Planning Areas",
+    "region_n": "Regions",
+}
+
+# %% Functions
+
+
+def dissolveZones(gdf, key):
+    """
+    Returns one row per zone of key, with the keys above it kept.
+    """
+    keys = ZONE_KEYS[ZONE_KEYS.index(key) :]
+    # observed=True, the keys are categoricals and every other combination is empty.
+    # GeoDataFrame.dissolve can't pass it on, so the shapes are merged group by group.
+    grouped = gdf.groupby(keys, sort=True, observed=True)
+    sums = grouped[["area_km2", "pop"]].sum().reset_index()
+    shapes = [normalize(unary_union(list(s))) for _, s in grouped[gdf.geometry.name]]
+    zones = gpd.GeoDataFrame(sums, geometry=shapes, crs=gdf.crs)
+    zones["pop_density/km2"] = (zones["pop"] / zones["area_km2"]).round(0).astype(int)
+    return zones
+
+
+def zonePath(filename, key, zoom):
+    return cachePath(f"{os.path.basename(filename)}.{key}.z{zoom}.store")
+
+
+def loadZones(filename, key, zoom):
+    """
+    Returns the boundaries of key (subzone_n, pln_area_n or region_n) simplified for a
+    zoom level, building them if they are stale.
+    """
+    if key == "subzone_n":
+        return loadLevel(filename, zoom)
+    folder = zonePath(filename, key, zoom)
+    base = storePath(filename)
+    if isFresh(base, filename) and os.path.isfile(os.path.join(folder, "meta.json")):
+        meta = readMeta(folder)
+        if meta.get("sha256") == readMeta(base)["sha256"]:
+            if meta.get("version") == STORE_VERSION:
+                return readFrame(folder)
+    zones = simplifyLevel(dissolveZones(loadBoundary(filename), key), zoom)
+    writeFrame(
+        zones,
+        folder,
+        extra_meta={"sha256": readMeta(base)["sha256"], "key": key, "zoom": zoom},
+    )
+    return zones
+
+
+def zoneURL(key, zoom):
+    return ZONE_URL.format(key=key, zoom=zoom)
+
+
+@lru_cache(maxsize=None)
+def zoneGeoJSON(filename, key, zoom):
+    """
+    Returns the path of a layer's GeoJSON and its sha256 prefix, writing the file plus a
+    gzip copy on first use. The name carries the boundary file's hash, so a changed
+    boundary file gets new files instead of stale ones.
+    """
+    zones = loadZones(filename, key, zoom)
+    digest = readMeta(storePath(filename))["sha256"][:16]
+    path = cachePath(f"{os.path.basename(filename)}.{key}.z{zoom}.{digest}.geojson")
+    if not os.path.isfile(path + ".gz"):
+        cols = [c for c in ZONE_PROPERTIES if c in zones.columns]
+        out = zones[cols + [zones.geometry.name]].copy()
+        out["area_km2"] = out["area_km2"].astype(float).round(2)
+        body = out.to_json().encode("utf-8")
+        # The gzip copy is written last, its presence marks a complete pair
+        for suffix, data in (("", body), (".gz", gzip.compress(body, compresslevel=9))):
+            tmp = f"{path}{suffix}.tmp-{os.getpid()}"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path + suffix)
+    return path, digest
+
+
+def registerZoneRoutes(server, filename="./data/r2_cleanboundary.geojson"):
+    """
+    Adds /zones/<key>/z<zoom>.geojson for every layer of ZOOM_LAYERS to the Flask server.
+    """
+    layers = {(key, zoom) for key, _, _, zoom in ZOOM_LAYERS}
+    bodies = {}
+
+    @server.route("/zones/<key>/z<int:zoom>.geojson")
+    def zoneLayer(key, zoom):
+        if (key, zoom) not in layers:
+            abort(404)
+        path, digest = zoneGeoJSON(filename, key, zoom)
+        encoding, suffix = pickEncoding(
+            request.headers.get("Accept-Encoding", ""), {"gzip", "identity"}
+        )
+        etag = f'"{digest}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=304, headers=headers)
+        if (path, suffix) not in bodies:
+            with open(path + suffix, "rb") as f:
+                bodies[path, suffix] = f.read()
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            bodies[path, suffix], mimetype="application/geo+json", headers=headers
+        )
+
+    return server
+
+
+def main():
+    filename = "./data/r2_cleanboundary.geojson"
+    rows = []
+    for key, min_zoom, max_zoom, zoom in ZOOM_LAYERS:
+        zones = loadZones(filename, key, zoom)
+        # Written now so the app's first request for it doesn't have to
+        path, _ = zoneGeoJSON(filename, key, zoom)
+        rows.append(
+            {
+                "layer": key,
+                "zooms": f"{min_zoom}-{max_zoom or ''}",
+                "features": len(zones),
+                "vertices": int(zones.geometry.apply(countVertices).sum()),
+                "bytes": os.path.getsize(path),
+                "gzip_bytes": os.path.getsize(path + ".gz"),
+            }
+        )
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+# %% Main execute
+if __name__ == "__main__":
+    main()